@@ -0,0 +1,15 @@
+"""
+Benchmark of the Sokoban solver: a curated level set from tiny to very hard,
+with single and multiple robots, a runner that solves every level with every
+configuration and records expansions, nodes/s, cost and peak memory, and a
+check of the results against a stored baseline.
+
+Run it from the A1-Final directory:
+
+    python -m benchmark                    # run and compare with baseline.json
+    python -m benchmark --update-baseline  # run and store a new baseline
+    python -m benchmark --scaling          # report the HDA* speedup per worker count
+"""
+
+from .runner import CONFIGS, SCALING_CONFIGS, benchmark_levels, run_benchmark, compare_results, \
+    scaling_report, load_results, save_results
@@ -0,0 +1,108 @@
+import argparse
+import os
+import sys
+
+from .runner import *
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog="python -m benchmark")
+    parser.add_argument(
+        "--levels",
+        type=str,
+        required=False,
+        default="*",
+        help="Glob pattern of the benchmark level names to run (default: all)."
+    )
+    parser.add_argument(
+        "--algorithm",
+        type=str,
+        required=False,
+        default=None,
+        help="Only run the configurations of this algorithm."
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        required=False,
+        default=TIMEOUT,
+        help="Seconds allowed per run."
+    )
+    parser.add_argument(
+        "--memory-limit",
+        type=int,
+        required=False,
+        default=MEMORY_LIMIT,
+        help="Megabytes of memory allowed per run."
+    )
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        required=False,
+        default=BASELINE_FILE,
+        help="The stored results to compare with."
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        required=False,
+        default=None,
+        help="Also store the results of this run in the given file."
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Store the results of this run as the new baseline instead of comparing."
+    )
+    parser.add_argument(
+        "--scaling",
+        action="store_true",
+        help="Run the HDA* worker sweep and report its speedups instead of the baseline configurations."
+    )
+    parser.add_argument(
+        "--expansion-tolerance",
+        type=float,
+        required=False,
+        default=EXPANSION_TOLERANCE,
+        help="Relative increase in expansions that counts as a regression."
+    )
+    parser.add_argument(
+        "--parallel-expansion-tolerance",
+        type=float,
+        required=False,
+        default=PARALLEL_EXPANSION_TOLERANCE,
+        help="Relative increase in expansions that counts as a regression for parallel searches."
+    )
+    parser.add_argument(
+        "--time-tolerance",
+        type=float,
+        required=False,
+        default=TIME_TOLERANCE,
+        help="Relative increase in time that counts as a regression."
+    )
+    args = parser.parse_args()
+
+    configs = SCALING_CONFIGS if args.scaling else CONFIGS
+    configs = [config for config in configs if args.algorithm in (None, config[0])]
+    results = run_benchmark(benchmark_levels(args.levels), configs, args.timeout, args.memory_limit)
+    if args.output:
+        save_results(results, args.output)
+
+    if args.scaling:
+        for line in scaling_report(results):
+            print(line)
+        sys.exit(0)
+
+    if args.update_baseline:
+        baseline = load_results(args.baseline) if os.path.exists(args.baseline) else {}
+        baseline.update(results)
+        save_results(baseline, args.baseline)
+        print('Stored {} results in {}'.format(len(results), args.baseline))
+        sys.exit(0)
+
+    regressions = compare_results(results, load_results(args.baseline), args.expansion_tolerance,
+                                  args.time_tolerance, parallel_expansion_tolerance=args.parallel_expansion_tolerance)
+    for regression in regressions:
+        print('REGRESSION ' + regression)
+    print('{} runs, {} regressions'.format(len(results), len(regressions)))
+    sys.exit(1 if regressions else 0)
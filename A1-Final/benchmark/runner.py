@@ -0,0 +1,256 @@
+############################################################
+## CSC 384, Intro to AI, University of Toronto.
+## Benchmark of the Sokoban solver
+############################################################
+
+from typing import List
+import glob
+import json
+import multiprocessing
+import os
+import random
+import sys
+
+# solve.py and board.py live next to this package and import each other as top-level modules.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from solve import read_from_file, solve_level
+
+# Directory of the curated benchmark levels.
+LEVEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'levels')
+
+# The stored results new runs are compared with.
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Seed of the random module before every run, so that runs are repeatable.
+BENCHMARK_SEED = 384
+
+# Seconds allowed per run, and extra seconds before a run that ignores its timeout is killed.
+TIMEOUT = 10.0
+KILL_GRACE = 5.0
+
+# Megabytes of memory allowed per run.
+MEMORY_LIMIT = 2048
+
+# Relative increases over the baseline that count as regressions.
+EXPANSION_TOLERANCE = 0.1
+PARALLEL_EXPANSION_TOLERANCE = 0.5  # parallel searches, whose workers race each other
+TIME_TOLERANCE = 0.5
+MEMORY_TOLERANCE = 0.5
+
+# Time differences below this many seconds are noise, never regressions.
+MIN_TIME_DELTA = 0.05
+
+# Configurations run on every level: (algorithm, heuristic, moves, options). Every
+# single-process heuristic search is run with every heuristic; the other searches,
+# and the move and node-store modes, with the heuristic that suits them.
+CONFIGS = [(algorithm, heuristic, moves, options)
+           for algorithm, moves, options in [('a_star', 'step', {}),
+                                             ('ida_star', 'step', {}),
+                                             ('anytime', 'push', {'time_limit': TIMEOUT / 2}),
+                                             ('greedy', 'push', {}),
+                                             ('beam', 'push', {})]
+           for heuristic in ('basic', 'advanced', 'matching')] + [
+    ('a_star', 'matching', 'push', {}),
+    ('a_star', 'matching', 'step', {'node_store': True}),
+    ('bidirectional', 'matching', 'push', {'time_limit': TIMEOUT / 2}),
+    ('hda_star', 'matching', 'step', {'workers': 2}),
+    ('dfs', 'zero', 'push', {}),
+]
+
+# HDA* configurations of the scaling sweep, one per worker count. The sweep is
+# reported on its own and never compared with the baseline, since its timings
+# depend on the cores of the machine it runs on.
+SCALING_WORKERS = sorted({1, 2, 4, 8, 16, os.cpu_count() or 1})
+SCALING_CONFIGS = [('hda_star', 'matching', 'step', {'workers': workers}) for workers in SCALING_WORKERS]
+
+
+def config_name(level: str, config) -> str:
+    """
+    Return the key of a run in the results, e.g. 'easy_corridor/a_star/matching/step'.
+    """
+    algorithm, heuristic, moves, options = config
+    name = '/'.join((level, algorithm, heuristic, moves))
+    if options:
+        name += '/' + ','.join('{}={}'.format(*item) for item in sorted(options.items()))
+    return name
+
+
+def is_parallel(config) -> bool:
+    """
+    Return whether a configuration spreads its search over several processes,
+    so that its expansions vary from run to run.
+    """
+    algorithm, _, _, options = config
+    return algorithm == 'hda_star' and options.get('workers') != 1
+
+
+def benchmark_levels(pattern='*') -> List[str]:
+    """
+    Return the benchmark level files whose names match the given pattern, sorted.
+    """
+    return sorted(glob.glob(os.path.join(LEVEL_DIR, pattern + '.txt')))
+
+
+def _benchmark_worker(level_file, config, timeout, memory_limit, connection):
+    """
+    Helper, run one configuration on one level in its own process and send
+    the result record through the connection.
+    """
+    algorithm, heuristic, moves, options = config
+    random.seed(BENCHMARK_SEED)
+    board = read_from_file(level_file)
+    result, _ = solve_level(board, algorithm, heuristic, moves, options, timeout, memory_limit)
+    if result['expanded'] is not None and result['time']:
+        result['nodes_per_sec'] = round(result['expanded'] / result['time'])
+    if is_parallel(config):
+        result['parallel'] = True
+    if 'time_limit' in options:
+        result['time_limit'] = options['time_limit']
+    connection.send(result)
+    connection.close()
+
+
+def run_benchmark(levels=None, configs=None, timeout=TIMEOUT, memory_limit=MEMORY_LIMIT,
+                  verbose=True) -> dict:
+    """
+    Run every configuration on every level, one fresh process per run, and
+    return the result records keyed by config_name. A record holds the
+    status, cost, expansions, nodes/s, time and peak memory of the run.
+
+    :param levels: the level files, every benchmark level by default
+    :type levels: Optional[List[str]]
+    :param configs: the (algorithm, heuristic, moves, options) configurations, CONFIGS by default
+    :type configs: Optional[List[tuple]]
+    :param timeout: seconds allowed per run
+    :type timeout: float
+    :param memory_limit: megabytes of memory allowed per run
+    :type memory_limit: int
+    :param verbose: whether to print a line per run
+    :type verbose: bool
+    :return: the result records
+    :rtype: dict
+    """
+    if levels is None:
+        levels = benchmark_levels()
+    if configs is None:
+        configs = CONFIGS
+    results = {}
+    for level_file in levels:
+        level = os.path.splitext(os.path.basename(level_file))[0]
+        for config in configs:
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            # Not a daemon, so that parallel searches can start their own workers.
+            process = multiprocessing.Process(target=_benchmark_worker,
+                                              args=(level_file, config, timeout, memory_limit, sender))
+            process.start()
+            sender.close()
+            result = {'status': 'killed', 'cost': None, 'expanded': None, 'time': timeout}
+            if receiver.poll(timeout + KILL_GRACE):
+                try:
+                    result = receiver.recv()
+                except EOFError:
+                    result['status'] = 'crashed'
+            process.join(KILL_GRACE)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+            name = config_name(level, config)
+            results[name] = result
+            if verbose:
+                print('{:70} {:10} cost {:>5} expanded {:>8} {:8.2f}s'.format(
+                    name, result['status'], str(result['cost']), str(result['expanded']),
+                    result['time']), flush=True)
+    return results
+
+
+def compare_results(results: dict, baseline: dict, expansion_tolerance=EXPANSION_TOLERANCE,
+                    time_tolerance=TIME_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE,
+                    parallel_expansion_tolerance=PARALLEL_EXPANSION_TOLERANCE) -> List[str]:
+    """
+    Compare result records with a baseline and return a message per
+    regression: a run that no longer solves its level, finds a costlier
+    solution, or exceeds the baseline expansions, time or peak memory by
+    more than the given relative tolerances. Runs missing from either side
+    are not compared.
+
+    Parallel runs have their expansions compared with
+    PARALLEL_EXPANSION_TOLERANCE instead. A run that stops at a time limit
+    returns whatever it found by then, which depends on the speed of the
+    machine, so it is not compared if either side used up its limit.
+
+    :param results: the new result records
+    :type results: dict
+    :param baseline: the baseline result records
+    :type baseline: dict
+    :return: the regressions found
+    :rtype: List[str]
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        time_limit = result.get('time_limit')
+        if time_limit is not None and max(result['time'], base['time']) >= time_limit:
+            continue
+        if base['status'] == 'solved' and result['status'] != 'solved':
+            regressions.append('{}: {} instead of solved'.format(name, result['status']))
+            continue
+        if base['status'] != 'solved' or result['status'] != 'solved':
+            continue
+        if result['cost'] > base['cost']:
+            regressions.append('{}: cost {} instead of {}'.format(name, result['cost'], base['cost']))
+        tolerance = parallel_expansion_tolerance if result.get('parallel') else expansion_tolerance
+        if base.get('expanded') is not None and result.get('expanded') is not None \
+                and result['expanded'] > base['expanded'] * (1 + tolerance):
+            regressions.append('{}: {} expansions instead of {}'.format(
+                name, result['expanded'], base['expanded']))
+        if result['time'] > base['time'] * (1 + time_tolerance) \
+                and result['time'] - base['time'] > MIN_TIME_DELTA:
+            regressions.append('{}: {:.2f}s instead of {:.2f}s'.format(name, result['time'], base['time']))
+        if base.get('peak_rss') and result.get('peak_rss') \
+                and result['peak_rss'] > base['peak_rss'] * (1 + memory_tolerance):
+            regressions.append('{}: peak memory {} bytes instead of {}'.format(
+                name, result['peak_rss'], base['peak_rss']))
+    return regressions
+
+
+def scaling_report(results: dict) -> List[str]:
+    """
+    Return a line per run of the scaling sweep in the given result records:
+    its time, expansions, nodes/s and speedup over the one-worker run of the
+    same level.
+    """
+    lines = []
+    for level in sorted({name.split('/')[0] for name in results}):
+        base = results.get(config_name(level, SCALING_CONFIGS[0]))
+        for config in SCALING_CONFIGS:
+            result = results.get(config_name(level, config))
+            if result is None:
+                continue
+            speedup = ''
+            if base is not None and base['status'] == 'solved' and result['status'] == 'solved' \
+                    and result['time']:
+                speedup = '{:.2f}x'.format(base['time'] / result['time'])
+            lines.append('{:24} workers {:>3} {:10} expanded {:>8} {:>8} nodes/s {:8.2f}s {:>7}'.format(
+                level, config[3]['workers'], result['status'], str(result['expanded']),
+                str(result.get('nodes_per_sec')), result['time'], speedup))
+    return lines
+
+
+def load_results(filename=BASELINE_FILE) -> dict:
+    """
+    Return the result records stored in a JSON file.
+    """
+    with open(filename) as results_file:
+        return json.load(results_file)
+
+
+def save_results(results: dict, filename=BASELINE_FILE):
+    """
+    Store result records in a JSON file.
+    """
+    with open(filename, 'w') as results_file:
+        json.dump(results, results_file, indent=1, sort_keys=True)
+        results_file.write('\n')
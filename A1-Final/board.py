@@ -6,6 +6,9 @@
 
 
 from typing import List
+from array import array
+import hashlib
+import random
 
 # Define characters for the elements in the puzzle
 CHAR_WALL = '#'
@@ -15,13 +18,241 @@ CHAR_BOX_IN_STORAGE = '*' # a box is at a storage point.
 CHAR_ROBOT = 'a'
 CHAR_ROBOT_IN_STORAGE = 'A' # a robot is at a storage point.
 
+# Characters of the XSB collection format, also accepted by iter_levels.
+XSB_BOX = '$'
+XSB_ROBOT = '@'
+XSB_ROBOT_IN_STORAGE = '+'
+XSB_FLOOR = '-_' # both stand for an empty floor cell.
+XSB_COMMENT = ';'
+
+# The four directions a robot can move in, as (dx, dy): right, left, up, down.
+DIRECTIONS = ((1, 0), (-1, 0), (0, -1), (0, 1))
+
+# Radius of the square neighbourhood the freeze-deadlock detector looks at around a pushed box.
+DEADLOCK_RADIUS = 2
+
+# Entry of the push-distance table for a cell from which a box can never reach the storage point.
+UNREACHABLE = 0xFFFF
+
+# Seed for the Zobrist keys, fixed so that hashes are reproducible across runs.
+ZOBRIST_SEED = 384
+
+
+def bit_indices(bits: int) -> List[int]:
+    """
+    Return the indices of the bits set in the given bitboard, in increasing order.
+    """
+    indices = []
+    while bits:
+        low = bits & -bits
+        indices.append(low.bit_length() - 1)
+        bits ^= low
+    return indices
+
+
+class Level:
+    """
+    The static layer of a puzzle.
+
+    Walls and storage points never change during a search, so every board
+    generated from the same puzzle shares a single Level. Every non-wall cell
+    of the grid is a floor cell; floor cells are numbered row by row and cell
+    i is represented by bit i of a bitboard.
+
+    Building a Level is the one-time preprocessing step of a puzzle: besides
+    the cell numbering it precomputes a flat grid of cell indices and the
+    4-neighbour table of every floor cell, so the search never has to
+    scan the wall list.
+    """
+
+    def __init__(self, name: str, width: int, height: int, storage: List[tuple], obstacles: List[tuple]):
+        """
+        :param name: the name of the Sokoban board
+        :type name: str
+        :param width: the width of the Sokoban board
+        :type width: int
+        :param height: the height of the Sokoban board
+        :type height: int
+        :param storage: positions for all the storage points in a list.
+        :type storage: List[tuple]
+        :param obstacles: locations of all of the obstacles (i.e. walls) in a list.
+        :type obstacles: List[tuple]
+        """
+        self.name = name
+        self.width = width
+        self.height = height
+        self.storage = storage
+        self.obstacles = obstacles
+
+        walls = set(obstacles)
+        self.cells = [(x, y) for y in range(height) for x in range(width) if (x, y) not in walls]
+        self.index = {coor: i for i, coor in enumerate(self.cells)}
+        self.storage_bits = self.to_bits(storage)
+
+        # Flat grid indexed by x + y * width: the floor cell index, or -1 for walls.
+        self.grid = array('i', [-1] * (width * height))
+        for i, (x, y) in enumerate(self.cells):
+            self.grid[x + y * width] = i
+
+        # neighbours[i][d] is the floor cell next to cell i in DIRECTIONS[d], or -1 for a wall.
+        self.neighbours = [tuple(self.cell_at(x + dx, y + dy) for dx, dy in DIRECTIONS)
+                           for x, y in self.cells]
+
+        # Bitboard of the dead squares: cells from which a box can never reach any storage point.
+        self.dead_bits = ((1 << len(self.cells)) - 1) & ~self.pull_reachable(self.storage_bits)
+
+        # window_bits[i] is the bitboard of the floor cells within DEADLOCK_RADIUS of cell i.
+        self.window_bits = []
+        for x, y in self.cells:
+            window = 0
+            for wy in range(y - DEADLOCK_RADIUS, y + DEADLOCK_RADIUS + 1):
+                for wx in range(x - DEADLOCK_RADIUS, x + DEADLOCK_RADIUS + 1):
+                    cell = self.cell_at(wx, wy)
+                    if cell >= 0:
+                        window |= 1 << cell
+            self.window_bits.append(window)
+
+        # Learned deadlock patterns, keyed by (cell, boxes within the window of the cell).
+        self.deadlocks = {}
+
+        # Dense storage x cell push-distance table, computed on first use.
+        self._push_distances = None
+
+        # Box-to-storage matchings of recently seen box configurations, keyed by box bitboard.
+        self.matchings = {}
+
+        # Zobrist keys: one random 64-bit key per floor cell for a box and for a robot.
+        rng = random.Random(ZOBRIST_SEED)
+        self.box_keys = [rng.getrandbits(64) for _ in self.cells]
+        self.robot_keys = [rng.getrandbits(64) for _ in self.cells]
+
+    @classmethod
+    def from_board(cls, board):
+        """
+        Build the static layer of the given board.
+        """
+        return cls(board.name, board.width, board.height, board.storage, board.obstacles)
+
+    def layout_key(self) -> str:
+        """
+        Return a digest of the static layout (size, walls and storage points),
+        used to key data cached on disk for this level.
+        """
+        layout = '{}x{}|{}|{}'.format(self.width, self.height,
+                                     sorted(self.obstacles), sorted(self.storage))
+        return hashlib.sha1(layout.encode()).hexdigest()
+
+    def pull_reachable(self, start_bits: int) -> int:
+        """
+        Return the bitboard of every cell a box can be pulled to from the given
+        cells, ignoring other boxes and robots. These are exactly the cells from
+        which a box can be pushed onto one of the given cells.
+        """
+        neighbours = self.neighbours
+        reached = start_bits
+        queue = bit_indices(start_bits)
+        while queue:
+            cell = queue.pop()
+            for direction in range(len(DIRECTIONS)):
+                # A box at prev is pushed onto cell by a robot standing at robot.
+                prev = neighbours[cell][direction]
+                if prev < 0 or reached >> prev & 1:
+                    continue
+                robot = neighbours[prev][direction]
+                if robot >= 0:
+                    reached |= 1 << prev
+                    queue.append(prev)
+        return reached
+
+    @property
+    def push_distances(self) -> array:
+        """
+        Dense storage x cell table of push distances: entry g * len(cells) + c is
+        the least number of pushes that brings a box from cell c onto storage
+        point g, ignoring other boxes and robots, or UNREACHABLE.
+        """
+        if self._push_distances is None:
+            self._push_distances = self.compute_push_distances()
+        return self._push_distances
+
+    @push_distances.setter
+    def push_distances(self, table: array):
+        if len(table) != len(self.storage) * len(self.cells):
+            raise ValueError('push-distance table does not fit level {}'.format(self.name))
+        self._push_distances = table
+
+    def compute_push_distances(self) -> array:
+        """
+        Build the push-distance table with one breadth-first search of box
+        pulls from each storage point.
+        """
+        neighbours = self.neighbours
+        size = len(self.cells)
+        table = array('H', [UNREACHABLE]) * (len(self.storage) * size)
+        for g, goal in enumerate(self.storage):
+            offset = g * size
+            start = self.index[goal]
+            table[offset + start] = 0
+            layer = [start]
+            distance = 0
+            while layer:
+                distance += 1
+                next_layer = []
+                for cell in layer:
+                    for direction in range(len(DIRECTIONS)):
+                        # A box at prev is pushed onto cell by a robot standing at robot.
+                        prev = neighbours[cell][direction]
+                        if prev < 0 or table[offset + prev] != UNREACHABLE:
+                            continue
+                        if neighbours[prev][direction] >= 0:
+                            table[offset + prev] = distance
+                            next_layer.append(prev)
+                layer = next_layer
+        return table
+
+    def cell_at(self, x: int, y: int) -> int:
+        """
+        Return the floor cell index at (x, y), or -1 for a wall or a point off the grid.
+        """
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.grid[x + y * self.width]
+        return -1
+
+    def to_bits(self, coors) -> int:
+        """
+        Return the bitboard with one bit set for each of the given floor cells.
+        """
+        bits = 0
+        for coor in coors:
+            bits |= 1 << self.index[coor]
+        return bits
+
+    def to_coors(self, bits: int) -> List[tuple]:
+        """
+        Return the floor cells set in the given bitboard, in cell order.
+        """
+        cells = self.cells
+        return [cells[i] for i in bit_indices(bits)]
+
+    def zobrist(self, boxes, robots) -> int:
+        """
+        Return the Zobrist hash of the given box and robot positions.
+        """
+        index = self.index
+        key = 0
+        for coor in boxes:
+            key ^= self.box_keys[index[coor]]
+        for coor in robots:
+            key ^= self.robot_keys[index[coor]]
+        return key
+
 class Board:
     """
     Represents the puzzle board.
     """
 
     def __init__(self, name: str, width: int, height: int, robots: object, boxes: object, storage: object,
-                 obstacles: object) -> object:
+                 obstacles: object, level: Level = None) -> object:
         """
         Creates a Sokoban board.
 
@@ -43,6 +274,8 @@ class Board:
 
         :param obstacles: locations of all of the obstacles (i.e. walls) in a list.
         :type obstacles: List[tuple]
+        :param level: the shared static layer of the board, built on demand if not given.
+        :type level: Optional[Level]
         :rtype: Board
         """
         self.name = name
@@ -52,12 +285,64 @@ class Board:
         self.robots = robots
         self.storage = storage
         self.obstacles = obstacles
+        self._level = level
+        self._zobrist = None
+
+    @property
+    def level(self) -> Level:
+        """
+        The static layer shared by all boards of this puzzle.
+        """
+        if self._level is None:
+            self.preprocess()
+        return self._level
+
+    @property
+    def zobrist(self) -> int:
+        """
+        The Zobrist hash of the boxes and robots, computed on first use.
+        Boards built by init_new_board have it filled in incrementally.
+        """
+        if self._zobrist is None:
+            self._zobrist = self.level.zobrist(self.boxes, self.robots)
+        return self._zobrist
+
+    def preprocess(self) -> Level:
+        """
+        Build the static layer of the board. read_from_file calls this once per
+        puzzle; boards derived from this one share the result.
+        """
+        self._level = Level.from_board(self)
+        return self._level
+
+    @property
+    def box_bits(self) -> int:
+        """
+        Bitboard of the cells holding a box.
+        """
+        return self.level.to_bits(self.boxes)
+
+    @property
+    def robot_bits(self) -> int:
+        """
+        Bitboard of the cells holding a robot.
+        """
+        return self.level.to_bits(self.robots)
+
+    def key(self):
+        """
+        Return a data item that UNIQUELY represents the boxes and robots of a board.
+        Boxes and robots are both interchangeable, so boards that only differ
+        in the order of their robots share a key.
+        """
+        return frozenset(self.boxes), frozenset(self.robots)
 
     def __hash__(self):
         '''
-        Return a data item that can be used as a dictionary key to UNIQUELY represent a board.
+        Return a data item that can be used as a dictionary key to represent a board.
+        Equal boards always share a hash; __eq__ resolves the rare collisions.
         '''
-        return hash(self.__str__())
+        return self.zobrist
 
     def display(self):
         print(self.__str__())
@@ -106,7 +391,102 @@ class Board:
     # customized eq for object comparison.
     def __eq__(self, other):
         if isinstance(other, Board):
-            return self.__str__() == other.__str__()
+            return self.key() == other.key()
+        return False
+
+
+class PackedBoard:
+    """
+    A compact board: the walls and storage points live in the shared Level,
+    and the boxes and robots are each stored as an integer bitboard over the
+    floor cells of the level.
+
+    A PackedBoard exposes the same attributes as a Board, so heuristics and
+    display code work on either. Robots are listed in cell order, so a robot's
+    label may change as it moves; see label_robots in solve.py.
+    """
+
+    __slots__ = ('level', 'box_bits', 'robot_bits', 'zobrist')
+
+    def __init__(self, level: Level, box_bits: int, robot_bits: int, zobrist: int = None):
+        """
+        :param level: the static layer of the puzzle.
+        :type level: Level
+        :param box_bits: bitboard of the cells holding a box.
+        :type box_bits: int
+        :param robot_bits: bitboard of the cells holding a robot.
+        :type robot_bits: int
+        :param zobrist: the Zobrist hash of the board, computed from the bitboards if not given.
+        :type zobrist: Optional[int]
+        """
+        self.level = level
+        self.box_bits = box_bits
+        self.robot_bits = robot_bits
+        if zobrist is None:
+            zobrist = level.zobrist(self.boxes, self.robots)
+        self.zobrist = zobrist
+
+    @classmethod
+    def from_board(cls, board):
+        """
+        Pack the given board, reusing its static layer.
+        """
+        level = board.level
+        return cls(level, level.to_bits(board.boxes), level.to_bits(board.robots), board.zobrist)
+
+    def unpack(self) -> Board:
+        """
+        Return an equivalent list-based Board.
+        """
+        return Board(self.name, self.width, self.height, self.robots, self.boxes,
+                     self.storage, self.obstacles, self.level)
+
+    @property
+    def name(self) -> str:
+        return self.level.name
+
+    @property
+    def width(self) -> int:
+        return self.level.width
+
+    @property
+    def height(self) -> int:
+        return self.level.height
+
+    @property
+    def storage(self) -> List[tuple]:
+        return self.level.storage
+
+    @property
+    def obstacles(self) -> List[tuple]:
+        return self.level.obstacles
+
+    @property
+    def boxes(self) -> List[tuple]:
+        return self.level.to_coors(self.box_bits)
+
+    @property
+    def robots(self) -> List[tuple]:
+        return self.level.to_coors(self.robot_bits)
+
+    def key(self):
+        """
+        Return a data item that UNIQUELY represents the boxes and robots of a board.
+        """
+        return self.box_bits, self.robot_bits
+
+    def __hash__(self):
+        return self.zobrist
+
+    def display(self):
+        print(self.__str__())
+
+    def __str__(self):
+        return self.unpack().__str__()
+
+    def __eq__(self, other):
+        if isinstance(other, PackedBoard):
+            return self.box_bits == other.box_bits and self.robot_bits == other.robot_bits
         return False
 
 
@@ -118,6 +498,9 @@ class State:
     heuristic function, f value, current depth and parent.
     """
 
+    # Millions of states may be alive at once, so they carry no __dict__.
+    __slots__ = ('board', 'parent', 'hfn', 'f', 'depth', 'id')
+
     def __init__(self, board: Board, hfn, f: int, depth: int, parent=None):
         """
         :param board: The board of the state.
@@ -167,43 +550,136 @@ def read_from_file(filename: str) -> Board:
     :rtype: Board
     """
 
-    puzzle_file = open(filename, "r")
-    counter = 0
-    width = -1
-    height = -1
-    name = ""
-
-    row = 0
-    board = Board("", -1, -1, [], [], [], [])
-
-    for line in puzzle_file:
-
-        if counter == 0: # first line has name of puzzle
-            board.name = line.strip()
-        elif counter == 1: # second line has width
-            board.width = int(line)
-        elif counter == 2: # third line has height
-            board.height = int(line)
-        else: # the following lines describe cars
-            for col in range(len(line)):
-                char = line[col]
-                if char == CHAR_WALL:
-                    board.obstacles.append((col, row))
-                elif char == CHAR_BOX_IN_STORAGE:
-                    board.boxes.append((col, row))
-                    board.storage.append((col, row))
-                elif char == CHAR_BOX:
-                    board.boxes.append((col, row))
-                elif char == CHAR_STORAGE:
-                    board.storage.append((col, row))
-                elif char.isalpha() and char.isupper():
-                    board.robots.append((col, row))
-                    board.storage.append((col, row))
-                elif char.isalpha() and char.islower():
-                    board.robots.append((col, row))
-            row += 1
-
-        counter += 1
-
-    puzzle_file.close()
-    return board
\ No newline at end of file
+    with open(filename, "r") as puzzle_file:
+        name = puzzle_file.readline().strip() # first line has name of puzzle
+        width = int(puzzle_file.readline()) # second line has width
+        height = int(puzzle_file.readline()) # third line has height
+        rows = [line.rstrip('\r\n') for line in puzzle_file] # the following lines describe the grid
+    return board_from_rows(name, rows, width, height)
+
+
+def board_from_rows(name: str, rows: List[str], width: int = None, height: int = None) -> Board:
+    """
+    Build a Board from the grid rows of a puzzle, in our format or the XSB
+    format. The width and height are inferred from the rows when missing.
+
+    :param name: The name of the puzzle.
+    :type name: str
+    :param rows: The grid rows, top to bottom.
+    :type rows: List[str]
+    :param width: The width of the grid, if given.
+    :type width: Optional[int]
+    :param height: The height of the grid, if given.
+    :type height: Optional[int]
+    :return: the loaded Board
+    :rtype: Board
+    """
+    if width is None:
+        width = max((len(line) for line in rows), default=0)
+    if height is None:
+        height = len(rows)
+    board = Board(name, width, height, [], [], [], [])
+
+    for row, line in enumerate(rows):
+        for col in range(len(line)):
+            char = line[col]
+            if char == CHAR_WALL:
+                board.obstacles.append((col, row))
+            elif char == CHAR_BOX_IN_STORAGE:
+                board.boxes.append((col, row))
+                board.storage.append((col, row))
+            elif char == CHAR_BOX or char == XSB_BOX:
+                board.boxes.append((col, row))
+            elif char == CHAR_STORAGE:
+                board.storage.append((col, row))
+            elif char == XSB_ROBOT_IN_STORAGE or char.isalpha() and char.isupper():
+                board.robots.append((col, row))
+                board.storage.append((col, row))
+            elif char == XSB_ROBOT or char.isalpha() and char.islower():
+                board.robots.append((col, row))
+
+    board.preprocess()
+    return board
+
+
+def is_grid_row(line: str) -> bool:
+    """
+    Return whether a line of a level collection is a row of a puzzle grid:
+    it holds nothing but grid characters, and the first and last of them
+    past the floor padding are walls, as in every row of a closed grid.
+    This keeps names such as 'Level #a' out of the grids.
+    """
+    trimmed = line.strip(' ' + XSB_FLOOR)
+    if not trimmed or trimmed[0] != CHAR_WALL or trimmed[-1] != CHAR_WALL:
+        return False
+    for char in line:
+        if not (char in ' #.?*$@+' or char in XSB_FLOOR or char.isascii() and char.isalpha()):
+            return False
+    return True
+
+
+def iter_levels(filename: str):
+    """
+    Read the puzzles of a level collection one at a time, yielding each
+    Board as soon as its grid is complete, so a long file is never loaded
+    whole.
+
+    Two layouts are accepted, and may be mixed. Our format gives the name,
+    then optionally the width and height on their own lines, then the grid.
+    The XSB format has grids of '#', ' ', '-', '_', '.', '$', '*', '@'
+    and '+' separated by blank lines, with ';' comment lines and
+    'Title: ...' lines; the last comment or title in front of a grid names
+    it.
+    Levels without a name are named after the file and their number.
+
+    :param filename: The name of the collection file.
+    :type filename: str
+    :return: the loaded Boards, in file order
+    :rtype: Iterator[Board]
+    """
+    name = None
+    width = height = None
+    rows = []
+    number = 0
+
+    def level():
+        nonlocal number
+        number += 1
+        return board_from_rows(name or '{} #{}'.format(filename, number), rows, width, height)
+
+    with open(filename, "r") as puzzle_file:
+        for line_number, line in enumerate(puzzle_file, 1):
+            line = line.rstrip('\r\n')
+            if height is not None and len(rows) < height:
+                rows.append(line)  # a grid of known height may hold any row
+                continue
+            if rows and (height is not None or not is_grid_row(line)):
+                yield level()
+                name = None
+                width = height = None
+                rows = []
+            if is_grid_row(line):
+                rows.append(line)
+                continue
+
+            stripped = line.strip()
+            if not stripped:
+                continue
+            if stripped.startswith(XSB_COMMENT):
+                name = stripped[1:].strip() or name  # the closest comment names the grid
+            elif stripped.isdigit() and name is not None and height is None:
+                if width is None:
+                    width = int(stripped)
+                else:
+                    height = int(stripped)
+            elif stripped.lower().startswith('title:'):
+                name = stripped[len('title:'):].strip() or name
+            elif stripped.split(':', 1)[0].isalpha() and ':' in stripped:
+                continue  # other metadata, e.g. 'Author: ...'
+            elif width is not None:
+                raise ValueError('{}:{}: expected the height of {!r}'.format(filename, line_number, name))
+            else:
+                name = stripped
+
+    if rows:
+        yield level()
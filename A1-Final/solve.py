@@ -10,6 +10,22 @@ from heapq import heappush, heappop
 import time
 import argparse
 import math # for infinity
+import json
+import multiprocessing
+import os
+import queue
+import glob
+import tracemalloc
+import struct
+import mmap
+import signal
+import shutil
+import tempfile
+try:
+    import resource
+except ImportError:  # not available on Windows, the memory cap is skipped
+    resource = None
+from array import array
 
 from board import *
 
@@ -22,7 +38,10 @@ def is_goal(state):
     :return: True or False
     :rtype: bool
     """
-    return set(state.board.boxes) == set(state.board.storage)
+    board = state.board
+    if isinstance(board, PackedBoard):
+        return board.box_bits == board.level.storage_bits
+    return set(board.boxes) == set(board.storage)
 
 
 def get_path(state):
@@ -44,20 +63,39 @@ def get_path(state):
     return state_path
 
 
-def is_space(curr_board: Board, coor: tuple) -> bool:
+def label_robots(path):
     """
-    Helper, check if the given coordinate is not a space.
+    Return the given step-by-step path with list-based boards whose robots
+    keep the order of the first board, so that each robot keeps its label
+    from step to step and the moving robot can be told apart.
 
-    :param curr_board: The current board.
-    :type curr_board: Board
-    :param coor: The coordinate to check.
-    :type coor: tuple
-    :return: True if the coordinate is not a space, False otherwise.
-    :rtype: bool
+    Robots are interchangeable in the search and packed boards list them
+    in cell order; this recovers their identity from the one robot that
+    moves between consecutive boards.
+
+    :param path: The path.
+    :type path: List[State]
+    :return: The relabelled path.
+    :rtype: List[State]
     """
-    if coor in curr_board.boxes or coor in curr_board.obstacles or coor in curr_board.robots:
-        return False
-    return True
+    labelled = []
+    robots = None
+    prev_state = None
+    for state in path:
+        board = state.board
+        if robots is None:
+            robots = list(board.robots)
+        else:
+            curr_robots = set(board.robots)
+            left = [i for i, robot in enumerate(robots) if robot not in curr_robots]
+            arrived = curr_robots.difference(robots)
+            for i, robot in zip(left, arrived):
+                robots[i] = robot
+        new_board = Board(board.name, board.width, board.height, robots[:], board.boxes,
+                          board.storage, board.obstacles, board.level)
+        prev_state = State(new_board, state.hfn, state.f, state.depth, prev_state)
+        labelled.append(prev_state)
+    return labelled
 
 
 def init_new_board(board: Board, robot_remove: tuple, robot_add: tuple,
@@ -72,21 +110,43 @@ def init_new_board(board: Board, robot_remove: tuple, robot_add: tuple,
     :param box_add: the box to add, if any
     :return: a new board with the given changes
     """
+    if isinstance(board, PackedBoard):
+        level = board.level
+        index = level.index
+        robot_bits = board.robot_bits ^ (1 << index[robot_remove]) | (1 << index[robot_add])
+        zobrist = board.zobrist ^ level.robot_keys[index[robot_remove]] ^ level.robot_keys[index[robot_add]]
+        box_bits = board.box_bits
+        if box_remove:
+            box_bits ^= 1 << index[box_remove]
+            zobrist ^= level.box_keys[index[box_remove]]
+        if box_add:
+            box_bits |= 1 << index[box_add]
+            zobrist ^= level.box_keys[index[box_add]]
+        return PackedBoard(level, box_bits, robot_bits, zobrist)
+
+    level = board.level
+    index = level.index
+    zobrist = board.zobrist ^ level.robot_keys[index[robot_remove]] ^ level.robot_keys[index[robot_add]]
     new_board = Board(board.name, board.width, board.height, board.robots[:],
-                 board.boxes[:], board.storage, board.obstacles)
-    new_board.robots.remove(robot_remove)
-    new_board.robots.append(robot_add)
+                 board.boxes[:], board.storage, board.obstacles, level)
+    # Replace the robot in place so that every robot keeps its index (and label).
+    new_board.robots[new_board.robots.index(robot_remove)] = robot_add
     if box_remove:
         new_board.boxes.remove(box_remove)
+        zobrist ^= level.box_keys[index[box_remove]]
     if box_add:
         new_board.boxes.append(box_add)
+        zobrist ^= level.box_keys[index[box_add]]
+    new_board._zobrist = zobrist
     return new_board
 
 
 def get_successors(state):
     """
     Return a list containing the successor states of the given state.
-    The states in the list may be in any arbitrary order.
+    The states in the list may be in any arbitrary order. Their f is copied
+    from the given state; the searches compute it once a successor has
+    passed their duplicate check.
 
     :param state: The current state.
     :type state: State
@@ -95,34 +155,634 @@ def get_successors(state):
     """
     successors = []
     curr_board = state.board
+    level = curr_board.level
+    cells = level.cells
+    neighbours = level.neighbours
+    dead_bits = level.dead_bits
+    box_bits = curr_board.box_bits
+    occupied = box_bits | curr_board.robot_bits
     for robot_coor in curr_board.robots:
-        right_move = (robot_coor[0] + 1, robot_coor[1])
-        left_move = (robot_coor[0] - 1, robot_coor[1])
-        up_move = (robot_coor[0], robot_coor[1] - 1)
-        down_move = (robot_coor[0], robot_coor[1] + 1)
-        for move in [right_move, left_move, up_move, down_move]:
-            if is_space(curr_board, move):
-                new_board = init_new_board(curr_board, robot_coor, move)
-                new_state = State(new_board,
-                                  state.hfn,
-                                  state.depth + 1 + state.hfn(new_board),
-                                  state.depth + 1, state)
+        for direction, move in enumerate(neighbours[level.index[robot_coor]]):
+            if move < 0:
+                continue
+            if not occupied >> move & 1:
+                new_board = init_new_board(curr_board, robot_coor, cells[move])
+                new_state = State(new_board, state.hfn,
+                                  state.f, state.depth + 1, state)
                 successors.append(new_state)
-            elif move in curr_board.boxes:
-                box_next_move = (move[0] + (move[0] - robot_coor[0]),
-                                 move[1] + (move[1] - robot_coor[1]))
-                if is_space(curr_board, box_next_move):
+            elif box_bits >> move & 1:
+                box_next_move = neighbours[move][direction]
+                # Pushes onto a dead square or into a frozen pattern are discarded
+                # before a state is built.
+                if box_next_move >= 0 and not (occupied | dead_bits) >> box_next_move & 1:
+                    new_box_bits = box_bits ^ (1 << move) | (1 << box_next_move)
+                    if is_freeze_deadlock(level, new_box_bits, box_next_move):
+                        continue
                     new_board = init_new_board(curr_board,
                                                robot_coor,
-                                               move, move,
-                                               box_next_move)
+                                               cells[move], cells[move],
+                                               cells[box_next_move])
                     new_state = State(new_board, state.hfn,
                                       state.f, state.depth + 1, state)
                     successors.append(new_state)
     return successors
 
 
-def dfs(init_board):
+def robot_reach(level: Level, start: int, blocked_bits: int):
+    """
+    Helper, breadth-first search of the cells a robot on the given cell can
+    walk to without entering a blocked cell.
+
+    :return: (walking distance of each reachable cell, the previous cell on a
+             shortest walk to it, None for the start)
+    :rtype: dict, dict
+    """
+    neighbours = level.neighbours
+    distances = {start: 0}
+    previous = {start: None}
+    layer = [start]
+    distance = 0
+    while layer:
+        distance += 1
+        next_layer = []
+        for cell in layer:
+            for move in neighbours[cell]:
+                if move >= 0 and move not in distances and not blocked_bits >> move & 1:
+                    distances[move] = distance
+                    previous[move] = cell
+                    next_layer.append(move)
+        layer = next_layer
+    return distances, previous
+
+
+def get_push_successors(state):
+    """
+    Return a list containing the successor states of the given state when
+    every action is a box push. A robot first walks to the cell behind a box
+    and then pushes it once; the walk is added to the depth of the successor
+    so that solution costs still count single robot steps.
+
+    :param state: The current state.
+    :type state: State
+    :return: The list of successor states.
+    :rtype: List[State]
+    """
+    successors = []
+    curr_board = state.board
+    level = curr_board.level
+    cells = level.cells
+    neighbours = level.neighbours
+    dead_bits = level.dead_bits
+    box_bits = curr_board.box_bits
+    robot_bits = curr_board.robot_bits
+    for robot_coor in curr_board.robots:
+        robot = level.index[robot_coor]
+        blocked = box_bits | robot_bits ^ (1 << robot)
+        distances, _ = robot_reach(level, robot, blocked)
+        for cell, distance in distances.items():
+            for direction, move in enumerate(neighbours[cell]):
+                if move < 0 or not box_bits >> move & 1:
+                    continue
+                box_next_move = neighbours[move][direction]
+                if box_next_move < 0 or (blocked | dead_bits) >> box_next_move & 1:
+                    continue
+                new_box_bits = box_bits ^ (1 << move) | (1 << box_next_move)
+                if is_freeze_deadlock(level, new_box_bits, box_next_move):
+                    continue
+                new_board = init_new_board(curr_board, robot_coor,
+                                           cells[move], cells[move],
+                                           cells[box_next_move])
+                new_state = State(new_board, state.hfn, state.f,
+                                  state.depth + distance + 1, state)
+                successors.append(new_state)
+    return successors
+
+
+def get_pull_successors(state):
+    """
+    Return a list containing the predecessor states of the given state when
+    every action is a box pull, i.e. a push played backwards: a robot walks
+    next to a box, then steps away from it dragging the box along. Used by
+    the backward half of the bidirectional search.
+
+    :param state: The current state.
+    :type state: State
+    :return: The list of states one push before the given state.
+    :rtype: List[State]
+    """
+    successors = []
+    curr_board = state.board
+    level = curr_board.level
+    cells = level.cells
+    neighbours = level.neighbours
+    box_bits = curr_board.box_bits
+    robot_bits = curr_board.robot_bits
+    for robot_coor in curr_board.robots:
+        robot = level.index[robot_coor]
+        blocked = box_bits | robot_bits ^ (1 << robot)
+        distances, _ = robot_reach(level, robot, blocked)
+        for cell, distance in distances.items():
+            for direction, box in enumerate(neighbours[cell]):
+                if box < 0 or not box_bits >> box & 1:
+                    continue
+                back = neighbours[cell][direction ^ 1]
+                if back < 0 or blocked >> back & 1:
+                    continue
+                new_board = init_new_board(curr_board, robot_coor,
+                                           cells[back], cells[box], cells[cell])
+                new_state = State(new_board, state.hfn, state.f,
+                                  state.depth + distance + 1, state)
+                successors.append(new_state)
+    return successors
+
+
+def push_key(board):
+    """
+    Return the explored-set key of a board in push mode: the boxes plus the
+    region each robot can walk to.
+
+    A robot alone in its connected region of free floor can reach every cell
+    of it, so it is represented by the lowest cell of the region. Robots
+    sharing a region may block each other and keep their exact positions.
+    Boards whose robots can walk into each other's positions share a key;
+    this collapses the state space, at the price that the step cost of a
+    solution is still exact but no longer guaranteed to be minimal, so only
+    the suboptimal searches use it; the others key on push_cell_key.
+
+    :param board: The board.
+    :type board: Board
+    :return: (box bitboard, normalised robot bitboard)
+    :rtype: tuple
+    """
+    level = board.level
+    neighbours = level.neighbours
+    box_bits = board.box_bits
+    robot_bits = board.robot_bits
+    normalised = 0
+    seen = 0
+    for robot in bit_indices(robot_bits):
+        if seen >> robot & 1:
+            continue
+        region = 1 << robot
+        stack = [robot]
+        while stack:
+            for move in neighbours[stack.pop()]:
+                if move >= 0 and not (region | box_bits) >> move & 1:
+                    region |= 1 << move
+                    stack.append(move)
+        seen |= region
+        robots_in_region = robot_bits & region
+        if robots_in_region & (robots_in_region - 1):
+            normalised |= robots_in_region
+        else:
+            normalised |= region & -region
+    return box_bits, normalised
+
+
+def push_cell_key(board):
+    """
+    Return the explored-set key of a board in push mode for the optimal
+    searches: the boxes plus the exact cell of each robot, which after a
+    push is the cell the box left. States that differ only by a walk are
+    never generated in push mode, so this keeps the state space small
+    while every key still has a single remaining walk cost, and step costs
+    stay minimal.
+
+    :param board: The board.
+    :type board: Board
+    :return: (box bitboard, robot bitboard)
+    :rtype: tuple
+    """
+    return board.box_bits, board.robot_bits
+
+
+def robot_zobrist(board, robot_bits: int) -> int:
+    """
+    Return the Zobrist hash of the given board with its robots moved to the
+    given cells, e.g. those of its push_key, from the board's own hash.
+
+    :param board: The board.
+    :type board: Board
+    :param robot_bits: The bitboard of the robot cells.
+    :type robot_bits: int
+    :return: The 64-bit Zobrist hash.
+    :rtype: int
+    """
+    zobrist = board.zobrist
+    robot_keys = board.level.robot_keys
+    for cell in bit_indices(board.robot_bits ^ robot_bits):
+        zobrist ^= robot_keys[cell]
+    return zobrist
+
+
+def zobrist_key(board, key_fn=None) -> int:
+    """
+    Return the 64-bit Zobrist hash of the explored-set key of a board: of
+    the board itself if key_fn is None, else of its boxes and the robot
+    cells of key_fn(board), a (box bitboard, robot bitboard) key.
+
+    :param board: The board.
+    :type board: Board
+    :param key_fn: The explored-set key function of the move mode, if any.
+    :type key_fn: Optional[Callable]
+    :return: The 64-bit Zobrist hash.
+    :rtype: int
+    """
+    if key_fn is None:
+        return board.zobrist
+    _, robot_bits = key_fn(board)
+    return robot_zobrist(board, robot_bits)
+
+
+def expand_push_path(path):
+    """
+    Return the step-by-step path of a path whose consecutive states differ
+    by a robot walk and at most one box push, e.g. a path of push mode
+    states. Walks are replayed along shortest routes around the boxes and
+    other robots.
+
+    :param path: The path with one state per push.
+    :type path: List[State]
+    :return: The path with one state per robot step.
+    :rtype: List[State]
+    """
+    if not path:
+        return []
+    steps = [State(path[0].board, path[0].hfn, path[0].f, 0)]
+    for state in path[1:]:
+        prev_state = steps[-1]
+        board = prev_state.board
+        level = board.level
+        box_bits = board.box_bits
+        robot_bits = board.robot_bits
+        next_box_bits = state.board.box_bits
+        next_robot_bits = state.board.robot_bits
+        if next_box_bits == box_bits and next_robot_bits == robot_bits:
+            continue
+        # The walking robot is the one that left its cell; a pushed box moved
+        # from the robot's final cell in the direction of the push.
+        start = bit_indices(robot_bits & ~next_robot_bits)[0]
+        end = bit_indices(next_robot_bits & ~robot_bits)[0]
+        box_next_move = None
+        if next_box_bits != box_bits:
+            box_next_move = bit_indices(next_box_bits & ~box_bits)[0]
+            direction = level.neighbours[end].index(box_next_move)
+            end = level.neighbours[end][direction ^ 1]
+        _, previous = robot_reach(level, start, box_bits | robot_bits ^ (1 << start))
+        walk = []
+        cell = end
+        while cell != start:
+            walk.append(cell)
+            cell = previous[cell]
+        walk.reverse()
+        cells = level.cells
+        robot = start
+        for cell in walk:
+            board = init_new_board(board, cells[robot], cells[cell])
+            prev_state = State(board, prev_state.hfn, prev_state.depth + 1, prev_state.depth + 1, prev_state)
+            steps.append(prev_state)
+            robot = cell
+        if box_next_move is not None:
+            pushed = level.neighbours[box_next_move][direction ^ 1]
+            board = init_new_board(board, cells[robot], cells[pushed], cells[pushed], cells[box_next_move])
+            prev_state = State(board, prev_state.hfn, prev_state.depth + 1, prev_state.depth + 1, prev_state)
+            steps.append(prev_state)
+    return steps
+
+
+def _frozen(level: Level, box_bits: int, window: int, cell: int, walls: int):
+    """
+    Helper, return the set of boxes frozen together with the box on the given
+    cell, or None if that box can still be moved along some axis.
+
+    Boxes in walls are treated as walls; only boxes inside window are looked at.
+    """
+    neighbours = level.neighbours
+    dead_bits = level.dead_bits
+    walls |= 1 << cell
+    frozen = {cell}
+    for axis in (0, 2):
+        first, second = neighbours[cell][axis], neighbours[cell][axis + 1]
+        # Blocked along this axis by a wall, or by dead squares on both sides.
+        if first < 0 or second < 0 or walls >> first & 1 or walls >> second & 1:
+            continue
+        if dead_bits >> first & 1 and dead_bits >> second & 1:
+            continue
+        # Blocked by a neighbouring box that is itself frozen.
+        for neighbour in (first, second):
+            if (box_bits & window) >> neighbour & 1:
+                neighbour_frozen = _frozen(level, box_bits, window, neighbour, walls)
+                if neighbour_frozen is not None:
+                    frozen |= neighbour_frozen
+                    break
+        else:
+            return None
+    return frozen
+
+
+def is_freeze_deadlock(level: Level, box_bits: int, box: int) -> bool:
+    """
+    Check whether the box just pushed onto the given cell is frozen, i.e.
+    can never move again, together with at least one box off storage. This
+    covers 2x2 blocks of boxes and walls and box pairs stuck along a wall.
+
+    Only boxes near the pushed one are examined, so the answer depends on the
+    cell and the boxes inside its window alone; it is memoised in the
+    deadlock table of the level under that key.
+
+    :param level: The static layer of the board.
+    :type level: Level
+    :param box_bits: The bitboard of the boxes after the push.
+    :type box_bits: int
+    :param box: The cell index of the pushed box.
+    :type box: int
+    :return: True if the push led to a deadlock, False otherwise.
+    :rtype: bool
+    """
+    window = level.window_bits[box]
+    key = (box, box_bits & window)
+    deadlock = level.deadlocks.get(key)
+    if deadlock is None:
+        frozen = _frozen(level, box_bits, window, box, 0)
+        deadlock = frozen is not None and any(not level.storage_bits >> cell & 1 for cell in frozen)
+        level.deadlocks[key] = deadlock
+    return deadlock
+
+
+def deadlock_table_path(level: Level, cache_dir: str) -> str:
+    """
+    Return the file the deadlock table of the given level is persisted to.
+    """
+    return os.path.join(cache_dir, level.layout_key() + '.deadlocks.json')
+
+
+def load_deadlock_table(level: Level, cache_dir: str):
+    """
+    Load the persisted deadlock table of the given level, if there is one.
+    """
+    path = deadlock_table_path(level, cache_dir)
+    if os.path.exists(path):
+        with open(path) as table_file:
+            for box, window_boxes, deadlock in json.load(table_file):
+                level.deadlocks[(box, int(window_boxes, 16))] = bool(deadlock)
+
+
+def save_deadlock_table(level: Level, cache_dir: str):
+    """
+    Persist the deadlock table of the given level.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    entries = [[box, '{:x}'.format(window_boxes), int(deadlock)]
+               for (box, window_boxes), deadlock in level.deadlocks.items()]
+    path = deadlock_table_path(level, cache_dir)
+    with open(path + '.tmp', 'w') as table_file:
+        json.dump(entries, table_file)
+    os.replace(path + '.tmp', path)
+
+
+def push_distances_path(level: Level, cache_dir: str) -> str:
+    """
+    Return the file the push-distance table of the given level is cached in.
+    """
+    return os.path.join(cache_dir, level.layout_key() + '.distances')
+
+
+def load_push_distances(level: Level, cache_dir: str):
+    """
+    Load the cached push-distance table of the given level, computing and
+    caching it first if there is none.
+    """
+    path = push_distances_path(level, cache_dir)
+    if os.path.exists(path):
+        table = array('H')
+        with open(path, 'rb') as table_file:
+            table.frombytes(table_file.read())
+        level.push_distances = table
+    else:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(path + '.tmp', 'wb') as table_file:
+            level.push_distances.tofile(table_file)
+        os.replace(path + '.tmp', path)
+
+
+# Successor function and explored-set key for each granularity of moves;
+# a key of None means the board itself is the key.
+MOVE_MODES = {
+    'step': (get_successors, None),
+    'push': (get_push_successors, push_key),
+}
+
+# The same for the searches whose step costs must stay minimal: merging the
+# robot positions of a region would merge states whose remaining walks differ.
+OPTIMAL_MOVE_MODES = {
+    'step': (get_successors, None),
+    'push': (get_push_successors, push_cell_key),
+}
+
+
+# Identifies snapshot files, and the version of their format.
+CHECKPOINT_MAGIC = b'SOKOSNAP'
+CHECKPOINT_VERSION = 2
+
+# Header of a snapshot: magic, version, algorithm, moves, heuristic, open list and
+# tie-break names, layout digest, Zobrist hash of the initial board, bytes per bitboard,
+# numbers of nodes, frontier entries and explored keys, then the generated, expanded and
+# duplicates counters.
+CHECKPOINT_HEADER = struct.Struct('<8sHBB24s8s8s20sQHQQQQQQ')
+
+# The searches and move modes a snapshot can hold, by their code in the header.
+CHECKPOINT_ALGORITHMS = ('a_star', 'dfs')
+CHECKPOINT_MOVES = ('step', 'push')
+
+
+def describe_heuristic(hfn) -> str:
+    """
+    Return the name of a heuristic: its name in HEURISTICS, or else the name
+    of its function.
+    """
+    for name, heuristic in HEURISTICS.items():
+        if heuristic is hfn:
+            return name
+    return getattr(hfn, '__name__', type(hfn).__name__)
+
+
+class SearchInterrupted(Exception):
+    """
+    Raised by a search that saved a snapshot because the process got SIGTERM.
+    """
+
+
+class Checkpoint:
+    """
+    Snapshots of a running a_star or dfs search, written to a binary file
+    every interval seconds and when the process receives SIGTERM, and read
+    back to resume the search.
+
+    A snapshot is laid out for one sequential write and a memory-mapped
+    read, without pickling any State: after a fixed header come the nodes
+    (the frontier states and all their ancestors) as columns of box and
+    robot bitboards, g, f and parent indices, then the frontier as node
+    indices, then the explored keys as box and robot bitboards.
+
+    The header names the search, its heuristic and open-list settings, so
+    that a search resumes only with the settings it was saved with. Every
+    snapshot rewrites the whole file, so it costs time in proportion to
+    the size of the search so far.
+    """
+
+    def __init__(self, filename: str, interval=None, resume=False):
+        """
+        :param filename: The snapshot file.
+        :type filename: str
+        :param interval: Seconds between two snapshots, None to only save on SIGTERM.
+        :type interval: Optional[float]
+        :param resume: Whether the search starts from the snapshot in the file.
+        :type resume: bool
+        """
+        self.filename = filename
+        self.interval = interval
+        self.resume = resume
+        self.terminated = False
+        self._next_save = time.time() + interval if interval else None
+        signal.signal(signal.SIGTERM, self._on_sigterm)
+
+    def _on_sigterm(self, signum, frame):
+        # Saving from inside the handler could catch the search halfway
+        # through an expansion, so only flag it for the next due().
+        self.terminated = True
+
+    def due(self) -> bool:
+        """
+        Return whether the search should save a snapshot now.
+        """
+        return self.terminated or self._next_save is not None and time.time() >= self._next_save
+
+    def save(self, algorithm: str, moves: str, init_board, frontier, explored, stats=None, settings=('', '', '')):
+        """
+        Write a snapshot of the search, replacing the previous one only once
+        it is complete. Raise SearchInterrupted afterwards if the process
+        got SIGTERM.
+
+        :param algorithm: 'a_star' or 'dfs'
+        :param moves: 'step' or 'push'
+        :param init_board: the initial board of the search
+        :param frontier: the live frontier states, in the order to push them back
+        :param explored: the explored set
+        :param stats: the counters of the search, if any
+        :param settings: the heuristic, open list and tie-break names of the search
+        """
+        level = init_board.level
+        width = (len(level.cells) + 7) // 8
+        index = {}  # id of a State -> its node index
+        nodes = []
+        for state in frontier:
+            while state is not None and id(state) not in index:
+                index[id(state)] = len(nodes)
+                nodes.append(state)
+                state = state.parent
+        if moves == 'push':
+            explored_bits = list(explored)
+        else:
+            explored_bits = [(board.box_bits, board.robot_bits) for board in explored]
+        counters = (stats.generated, stats.expanded, stats.duplicates) if stats is not None else (0, 0, 0)
+
+        temporary = self.filename + '.tmp'
+        with open(temporary, 'wb') as snapshot:
+            snapshot.write(CHECKPOINT_HEADER.pack(
+                CHECKPOINT_MAGIC, CHECKPOINT_VERSION, CHECKPOINT_ALGORITHMS.index(algorithm),
+                CHECKPOINT_MOVES.index(moves), *(name.encode('utf-8') for name in settings),
+                bytes.fromhex(level.layout_key()), init_board.zobrist,
+                width, len(nodes), len(frontier), len(explored_bits), *counters))
+            snapshot.write(b''.join(state.board.box_bits.to_bytes(width, 'little') for state in nodes))
+            snapshot.write(b''.join(state.board.robot_bits.to_bytes(width, 'little') for state in nodes))
+            array('I', (state.depth for state in nodes)).tofile(snapshot)
+            array('d', (state.f for state in nodes)).tofile(snapshot)
+            array('i', (index[id(state.parent)] if state.parent is not None else -1
+                        for state in nodes)).tofile(snapshot)
+            array('I', (index[id(state)] for state in frontier)).tofile(snapshot)
+            snapshot.write(b''.join(box_bits.to_bytes(width, 'little') for box_bits, _ in explored_bits))
+            snapshot.write(b''.join(robot_bits.to_bytes(width, 'little') for _, robot_bits in explored_bits))
+        os.replace(temporary, self.filename)
+
+        if self.interval:
+            self._next_save = time.time() + self.interval
+        if self.terminated:
+            raise SearchInterrupted('snapshot saved to {}'.format(self.filename))
+
+    def load(self, algorithm: str, moves: str, init_board, hfn, stats=None, settings=('', '', '')):
+        """
+        Read the snapshot of a search and return its frontier states, in the
+        order to push them back, and its explored set. The counters are
+        restored into stats. A snapshot of another search, other settings
+        (the heuristic, open list and tie-break names) or another level
+        raises a ValueError.
+
+        :return: (the frontier states, the explored set)
+        :rtype: List[State], set
+        """
+        level = init_board.level
+        with open(self.filename, 'rb') as snapshot, \
+                mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            (magic, version, algorithm_code, moves_code, heuristic, open_list, tie_break, layout, zobrist,
+             width, node_count, frontier_count, explored_count, *counters) = CHECKPOINT_HEADER.unpack_from(data)
+            if magic != CHECKPOINT_MAGIC or version != CHECKPOINT_VERSION:
+                raise ValueError('{} is not a snapshot of this version'.format(self.filename))
+            if (CHECKPOINT_ALGORITHMS[algorithm_code], CHECKPOINT_MOVES[moves_code]) != (algorithm, moves):
+                raise ValueError('{} holds a {} search over {} moves'.format(
+                    self.filename, CHECKPOINT_ALGORITHMS[algorithm_code], CHECKPOINT_MOVES[moves_code]))
+            # Names longer than their field were truncated when saved.
+            fields = (heuristic, open_list, tie_break)
+            saved = tuple(field.rstrip(b'\0') for field in fields)
+            if saved != tuple(name.encode('utf-8')[:len(field)] for name, field in zip(settings, fields)):
+                raise ValueError('{} holds a search with heuristic {!r}, open list {!r} and tie-break {!r}'.format(
+                    self.filename, *(name.decode('utf-8', 'replace') for name in saved)))
+            if layout != bytes.fromhex(level.layout_key()) or zobrist != init_board.zobrist:
+                raise ValueError('{} holds a search of another level'.format(self.filename))
+            offset = CHECKPOINT_HEADER.size
+
+            def bitboards(count):
+                nonlocal offset
+                values = [int.from_bytes(data[start:start + width], 'little')
+                          for start in range(offset, offset + count * width, width)]
+                offset += count * width
+                return values
+
+            def column(typecode, count):
+                nonlocal offset
+                values = array(typecode)
+                values.frombytes(data[offset:offset + count * values.itemsize])
+                offset += count * values.itemsize
+                return values
+
+            boxes = bitboards(node_count)
+            robots = bitboards(node_count)
+            depths = column('I', node_count)
+            f_values = column('d', node_count)
+            parents = column('i', node_count)
+            frontier_nodes = column('I', frontier_count)
+            explored_boxes = bitboards(explored_count)
+            explored_robots = bitboards(explored_count)
+
+        def make_board(box_bits, robot_bits):
+            board = PackedBoard(level, box_bits, robot_bits)
+            return board if isinstance(init_board, PackedBoard) else board.unpack()
+
+        nodes = [State(make_board(box_bits, robot_bits), hfn, f, depth)
+                 for box_bits, robot_bits, f, depth in zip(boxes, robots, f_values, depths)]
+        for state, parent in zip(nodes, parents):
+            if parent >= 0:
+                state.parent = nodes[parent]
+        if moves == 'push':
+            explored = set(zip(explored_boxes, explored_robots))
+        else:
+            explored = {make_board(box_bits, robot_bits)
+                        for box_bits, robot_bits in zip(explored_boxes, explored_robots)}
+        if stats is not None:
+            stats.generated, stats.expanded, stats.duplicates = counters
+        return [nodes[node] for node in frontier_nodes], explored
+
+
+def dfs(init_board, moves='step', stats=None, checkpoint=None):
     """
     Run the DFS algorithm given an initial board.
 
@@ -133,29 +793,151 @@ def dfs(init_board):
 
     :param init_board: The initial board.
     :type init_board: Board
+    :param moves: 'step' to expand single robot steps, 'push' to expand box pushes.
+    :type moves: str
+    :param stats: Counters to fill in, if any.
+    :type stats: Optional[SearchStats]
+    :param checkpoint: Where to save snapshots of the search, and whether to resume from one.
+    :type checkpoint: Optional[Checkpoint]
     :return: (the path to goal state, solution cost)
     :rtype: List[State], int
     """
-    init_state = State(init_board, heuristic_zero, 0, 0)
-    frontier = [init_state]
-    explored = set()
+    successors_fn, key_fn = MOVE_MODES[moves]
+    if stats is not None:
+        successors_fn = stats.timed(successors_fn, 'successor_time')
+        key_fn = stats.timed_key(key_fn)
+    if checkpoint is not None and checkpoint.resume:
+        frontier, explored = checkpoint.load('dfs', moves, init_board, heuristic_zero, stats)
+    else:
+        frontier = [State(init_board, heuristic_zero, 0, 0)]
+        explored = set()
     while frontier:
+        if checkpoint is not None and checkpoint.due():
+            checkpoint.save('dfs', moves, init_board, frontier, explored, stats)
         curr_state = frontier.pop()
-        # state_board = curr_state.board
-        # board_hash = hash(state_board)
-        board_hash = curr_state.id
-        if board_hash in explored:
+        # The explored set holds the boards themselves: lookups use the Zobrist
+        # hash and only fall back to comparing exact keys when hashes match.
+        key = key_fn(curr_state.board) if key_fn else curr_state.board
+        if key in explored:
+            if stats is not None:
+                stats.duplicates += 1
             continue
-        explored.add(board_hash)
+        explored.add(key)
         if is_goal(curr_state):
             return get_path(curr_state), curr_state.depth
-        successors = get_successors(curr_state)
+        successors = successors_fn(curr_state)
         frontier.extend(successors)
+        if stats is not None:
+            stats.expanded += 1
+            stats.generated += len(successors)
+            stats.update_peaks(len(frontier), len(explored))
     return [], -1
 
 
 
-def a_star(init_board, hfn):
+class HeapQueue:
+    """
+    A frontier ordered on f with heapq, ties broken by comparing states.
+    Works with any numeric f, including non-integer ones.
+    """
+
+    __slots__ = ('heap',)
+
+    def __init__(self):
+        self.heap = []
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __iter__(self):
+        return (state for _, state in self.heap)
+
+    def push(self, f, g: int, state):
+        heapq.heappush(self.heap, (f, state))
+
+    def pop(self):
+        return heapq.heappop(self.heap)[1]
+
+
+class BucketQueue:
+    """
+    A frontier of integer f values kept as one bucket per f, with O(1) push
+    and amortised O(1) pop of a state of least f.
+
+    With the 'g' tie-break a bucket holds one stack per g and pops from the
+    deepest, so on a plateau of equal f the states closest to a goal go
+    first; with 'lifo' a bucket is a single stack. States of infinite f,
+    i.e. dead states, are dropped.
+    """
+
+    __slots__ = ('buckets', 'min_f', 'size', 'deep')
+
+    def __init__(self, tie_break='g'):
+        self.buckets = []  # f -> stacks indexed by g ('g') or one stack ('lifo')
+        self.min_f = 0
+        self.size = 0
+        self.deep = tie_break == 'g'
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        """
+        Iterate over the states, each stack bottom first, so that pushing
+        them again in this order rebuilds the same queue.
+        """
+        for bucket in self.buckets[self.min_f:]:
+            if self.deep:
+                for stack in bucket:
+                    yield from stack
+            else:
+                yield from bucket
+
+    def push(self, f, g: int, state):
+        if f == math.inf:
+            return
+        if f != int(f):
+            raise ValueError('BucketQueue needs integer f values, got {}; use the heap open list'.format(f))
+        f = int(f)
+        buckets = self.buckets
+        while len(buckets) <= f:
+            buckets.append([])
+        bucket = buckets[f]
+        if self.deep:
+            while len(bucket) <= g:
+                bucket.append([])
+            bucket[g].append(state)
+        else:
+            bucket.append(state)
+        if f < self.min_f:
+            self.min_f = f
+        self.size += 1
+
+    def pop(self):
+        buckets = self.buckets
+        f = self.min_f
+        while not buckets[f]:
+            f += 1
+        self.min_f = f
+        bucket = buckets[f]
+        self.size -= 1
+        if not self.deep:
+            return bucket.pop()
+        state = bucket[-1].pop()
+        # Drop the emptied stacks at the top so that bucket[-1] stays the deepest non-empty one.
+        while bucket and not bucket[-1]:
+            bucket.pop()
+        return state
+
+
+# The open lists a_star can use, by name.
+OPEN_LISTS = {
+    'bucket': BucketQueue,
+    'heap': HeapQueue,
+}
+
+
+def a_star(init_board, hfn, moves='step', stats=None, open_list='bucket', tie_break='g', checkpoint=None):
     """
     Run the A_star search algorithm given an initial board and a heuristic function.
 
@@ -168,150 +950,2441 @@ def a_star(init_board, hfn):
     :type init_board: Board
     :param hfn: The heuristic function.
     :type hfn: Heuristic (a function that consumes a Board and produces a numeric heuristic value)
+    :param moves: 'step' to expand single robot steps, 'push' to expand box pushes.
+    :type moves: str
+    :param stats: Counters to fill in, if any.
+    :type stats: Optional[SearchStats]
+    :param open_list: 'bucket' for a BucketQueue, 'heap' for a HeapQueue, needed for non-integer heuristics.
+    :type open_list: str
+    :param tie_break: the tie-break of the BucketQueue among states of equal f, 'g' or 'lifo'.
+    :type tie_break: str
+    :param checkpoint: Where to save snapshots of the search, and whether to resume from one.
+    :type checkpoint: Optional[Checkpoint]
     :return: (the path to goal state, solution cost)
     :rtype: List[State], int
     """
-    init_state = State(init_board, hfn, hfn(init_board), 0)
-    frontier = []
-    heapq.heappush(frontier, (init_state.f, init_state))
-    explored = set()
+    successors_fn, key_fn = OPTIMAL_MOVE_MODES[moves]
+    # The tie-break only applies to the bucket open list.
+    settings = (describe_heuristic(hfn), open_list, tie_break if open_list == 'bucket' else '')
+    if stats is not None:
+        successors_fn = stats.timed(successors_fn, 'successor_time')
+        key_fn = stats.timed_key(key_fn)
+        hfn = stats.timed(hfn, 'heuristic_time')
+    frontier = BucketQueue(tie_break) if open_list == 'bucket' else OPEN_LISTS[open_list]()
+    if checkpoint is not None and checkpoint.resume:
+        states, explored = checkpoint.load('a_star', moves, init_board, hfn, stats, settings)
+    else:
+        states = [State(init_board, hfn, hfn(init_board), 0)]
+        explored = set()
+    # Best g of every state key in the frontier, so that a successor no
+    # better than a queued copy is dropped instead of pushed.
+    best_g = {}
+    for state in states:
+        best_g[key_fn(state.board) if key_fn else state.board] = state.depth
+        frontier.push(state.f, state.depth, state)
 
     while frontier:
-        _, curr_state = heapq.heappop(frontier)
-        # state_board = curr_state.board
-        # board_hash = hash(state_board)
-        board_hash = curr_state.id
-        if board_hash not in explored:
-            explored.add(board_hash)
-            if is_goal(curr_state):
-                return get_path(curr_state), curr_state.depth
-            successors = get_successors(curr_state)
-            for succ in successors:
-                succ.f = succ.depth + succ.hfn(succ.board)
-                heapq.heappush(frontier, (succ.f, succ))
+        if checkpoint is not None and checkpoint.due():
+            # Only the live entries are saved, stale ones are dropped on the way.
+            live = []
+            for state in frontier:
+                key = key_fn(state.board) if key_fn else state.board
+                if key not in explored and best_g.get(key) == state.depth:
+                    live.append(state)
+            checkpoint.save('a_star', moves, init_board, live, explored, stats, settings)
+        curr_state = frontier.pop()
+        key = key_fn(curr_state.board) if key_fn else curr_state.board
+        if key in explored or curr_state.depth > best_g[key]:
+            continue  # stale entry, the state was expanded or queued more cheaply
+        explored.add(key)
+        del best_g[key]
+        if is_goal(curr_state):
+            return get_path(curr_state), curr_state.depth
+        successors = successors_fn(curr_state)
+        if stats is not None:
+            stats.expanded += 1
+            stats.generated += len(successors)
+        for succ in successors:
+            succ_key = key_fn(succ.board) if key_fn else succ.board
+            if succ_key in explored or best_g.get(succ_key, math.inf) <= succ.depth:
+                if stats is not None:
+                    stats.duplicates += 1
+                continue
+            best_g[succ_key] = succ.depth
+            succ.f = succ.depth + succ.hfn(succ.board)
+            frontier.push(succ.f, succ.depth, succ)
+        if stats is not None:
+            stats.update_peaks(len(frontier), len(explored))
     return [], -1
 
 
-def heuristic_basic(board):
-    """
-    Returns the heuristic value for the given board
-    based on the Manhattan Distance Heuristic function.
-
-    Returns the sum of the Manhattan distances between each box 
-    and its closest storage point.
-
-    :param board: The current board.
-    :type board: Board
-    :return: The heuristic value.
-    :rtype: int
-    """
-    total_distance = 0
-    for box in board.boxes:
-        min_distance = board.height + board.width
-        for storage in board.storage:
-            distance = abs(box[0] - storage[0]) + abs(box[1] - storage[1])
-            if distance < min_distance:
-                min_distance = distance
-        total_distance += min_distance
-    return total_distance
+# Initial number of slots of the NodeStore hash table, a power of two.
+NODE_TABLE_SIZE = 1 << 16
 
+# Largest f value a NodeStore can hold; worse states are never expanded.
+NODE_MAX_F = 0xFFFFFFFF
 
-def check_deadlock(box: list, walls: list) -> bool:
-    """
-    Helper, check if the given box is in a deadlock state.
 
-    :param box: The box to check.
-    :type box: list
-    :param walls: The walls on the board.
-    :type walls: list
-    :return: True if the box is in a deadlock state, False otherwise.
+class NodeStore:
     """
-    box_up = (box[0], box[1] - 1)
-    box_down = (box[0], box[1] + 1)
-    box_left = (box[0] - 1, box[1])
-    box_right = (box[0] + 1, box[1])
-    if box_up in walls or box_down in walls:
-        if box_left in walls or box_right in walls:
-            return True
-    if box_left in walls or box_right in walls:
-        if box_up in walls or box_down in walls:
-            return True
-    return False
+    The nodes of a search kept in parallel typed arrays instead of State
+    objects: a node is an index into the arrays of 64-bit state keys, g and
+    f values, parent indices and move codes, and the keys are found again
+    through an open-addressing hash table of node indices. A closed node
+    costs 25 bytes in the arrays plus 5 to 11 bytes of table, against
+    several hundred for a State with its Board.
 
-
-def heuristic_advanced(board):
+    The key of a state is the Zobrist hash of its explored-set key, see
+    zobrist_key. Two states whose keys collide are taken to be the same
+    state; with random 64-bit keys this happens with probability about
+    n^2 / 2^65 for n states.
     """
-    An advanced heuristic of your own choosing and invention.
 
-    :param board: The current board.
-    :type board: Board
-    :return: The heuristic value.
-    :rtype: int
-    """
-    boxes = board.boxes
-    walls = board.obstacles
-    storages = board.storage
-    for box in boxes:
-        if box in storages:
-            continue
-        if check_deadlock(box, walls):
-            return math.inf
-    return heuristic_basic(board)
+    __slots__ = ('keys', 'g', 'f', 'parent', 'move', 'closed', 'table', 'mask')
 
+    def __init__(self, table_size: int = NODE_TABLE_SIZE):
+        self.keys = array('Q')
+        self.g = array('I')
+        self.f = array('I')
+        self.parent = array('i')
+        self.move = array('I')
+        self.closed = bytearray()
+        self.table = array('i', [-1]) * table_size
+        self.mask = table_size - 1
 
-def solve_puzzle(board: Board, algorithm: str, hfn):
-    """
-    Solve the given puzzle using the given type of algorithm.
+    def __len__(self):
+        return len(self.keys)
 
-    :param algorithm: the search algorithm
-    :type algorithm: str
-    :param hfn: The heuristic function
-    :type hfn: Optional[Heuristic]
+    def find(self, key: int) -> int:
+        """
+        Return the index of the node with the given key, or -1.
+        """
+        table = self.table
+        keys = self.keys
+        slot = key & self.mask
+        while True:
+            node = table[slot]
+            if node < 0 or keys[node] == key:
+                return node
+            slot = (slot + 1) & self.mask
 
-    :return: the path from the initial state to the goal state
-    :rtype: List[State]
-    """
+    def add(self, key: int, g: int, f: int, parent: int, move: int) -> int:
+        """
+        Add a node with a key not in the store yet and return its index.
+        """
+        node = len(self.keys)
+        self.keys.append(key)
+        self.g.append(g)
+        self.f.append(f)
+        self.parent.append(parent)
+        self.move.append(move)
+        self.closed.append(0)
+        if 4 * len(self.keys) > 3 * len(self.table):
+            self._grow()
+        else:
+            self._insert(node)
+        return node
 
-    print("Initial board")
-    board.display()
+    def _insert(self, node: int):
+        table = self.table
+        slot = self.keys[node] & self.mask
+        while table[slot] >= 0:
+            slot = (slot + 1) & self.mask
+        table[slot] = node
 
-    time_start = time.time()
+    def _grow(self):
+        """
+        Double the hash table, keeping it at most three quarters full.
+        """
+        self.table = array('i', [-1]) * (2 * len(self.table))
+        self.mask = len(self.table) - 1
+        for node in range(len(self.keys)):
+            self._insert(node)
 
-    if algorithm == 'a_star':
-        print("Executing A* search")
-        path, step = a_star(board, hfn)
-    elif algorithm == 'dfs':
-        print("Executing DFS")
-        path, step = dfs(board)
-    else:
-        raise NotImplementedError
+    def moves(self, node: int) -> List[int]:
+        """
+        Return the move codes from the initial node to the given node, in order.
+        """
+        codes = []
+        parent = self.parent
+        while parent[node] >= 0:
+            codes.append(self.move[node])
+            node = parent[node]
+        codes.reverse()
+        return codes
 
-    time_end = time.time()
-    time_elapsed = time_end - time_start
+    def nbytes(self) -> int:
+        """
+        Return the memory held by the arrays and the table, in bytes.
+        """
+        arrays = (self.keys, self.g, self.f, self.parent, self.move, self.table)
+        return sum(len(values) * values.itemsize for values in arrays) + len(self.closed)
 
-    if not path:
 
-        print('No solution for this puzzle')
-        return []
+def move_code(board: PackedBoard, next_board: PackedBoard) -> int:
+    """
+    Return the code of the move between two packed boards, read off the
+    bits that changed: (start cell << 2 | direction) for a robot step, and
+    ((robot start cell + 1) << 16 | box cell << 2 | direction) for a push
+    move that starts with a walk.
+    """
+    level = board.level
+    start = (board.robot_bits & ~next_board.robot_bits).bit_length() - 1
+    moved_boxes = board.box_bits & ~next_board.box_bits
+    if moved_boxes:
+        box = moved_boxes.bit_length() - 1
+        target = (next_board.box_bits & ~board.box_bits).bit_length() - 1
+        code = box << 2 | level.neighbours[box].index(target)
+        # A step is the one move where the robot starts right behind the box.
+        if level.neighbours[start][code & 3] == box:
+            return start << 2 | code & 3
+        return (start + 1) << 16 | code
+    end = (next_board.robot_bits & ~board.robot_bits).bit_length() - 1
+    return start << 2 | level.neighbours[start].index(end)
 
-    else:
 
-        print('Goal state found: ')
-        path[-1].board.display()
+def replay_moves(init_board: PackedBoard, codes: List[int], hfn) -> List[State]:
+    """
+    Return the path of states obtained by playing the given move codes (see
+    move_code) from the initial board. A push move leaves the robot on the
+    cell the box was pushed from, the walk before it is left to
+    expand_push_path.
+    """
+    level = init_board.level
+    cells = level.cells
+    neighbours = level.neighbours
+    board = init_board
+    path = [State(board, hfn, 0, 0)]
+    for code in codes:
+        direction = code & 3
+        if code >> 16:
+            start = (code >> 16) - 1
+            end = (code >> 2) & 0x3FFF
+        else:
+            start = code >> 2
+            end = neighbours[start][direction]
+        if board.box_bits >> end & 1:
+            target = neighbours[end][direction]
+            board = init_new_board(board, cells[start], cells[end], cells[end], cells[target])
+        else:
+            board = init_new_board(board, cells[start], cells[end])
+        path.append(State(board, hfn, len(path), len(path), path[-1]))
+    return path
 
-        print('Solution is: ')
 
-        counter = 0
-        while counter < len(path):
-            print(counter + 1)
-            path[counter].board.display()
-            print()
-            counter += 1
+def a_star_node_store(init_board, hfn, moves='step', stats=None):
+    """
+    Run the A_star search algorithm like a_star, but keep the nodes in a
+    NodeStore: only the boards of open states are held, in a dict, and the
+    path is rebuilt by replaying the move codes from the initial board.
+    Successors that reach an open state more cheaply update it in place;
+    closed states are never reopened, as in a_star.
 
-        print('Solution cost: {}'.format(step))
-        print('Time taken: {:.2f}s'.format(time_elapsed))
+    If the function finds a goal state, it returns a list of states representing
+    the path from the initial state to the goal state in order and the cost of
+    the solution found.
+    Otherwise, it returns am empty list and -1.
 
-        return path
+    :param init_board: The initial starting board.
+    :type init_board: Board
+    :param hfn: The heuristic function.
+    :type hfn: Heuristic (a function that consumes a Board and produces a numeric heuristic value)
+    :param moves: 'step' to expand single robot steps, 'push' to expand box pushes.
+    :type moves: str
+    :param stats: Counters to fill in, if any.
+    :type stats: Optional[SearchStats]
+    :return: (the path to goal state, solution cost)
+    :rtype: List[State], int
+    """
+    successors_fn, key_fn = OPTIMAL_MOVE_MODES[moves]
+    if not isinstance(init_board, PackedBoard):
+        init_board = PackedBoard.from_board(init_board)
+    store = NodeStore()
+    key = zobrist_key(init_board, key_fn)
+    h = hfn(init_board)
+    if h >= NODE_MAX_F:
+        return [], -1
+    root = store.add(key, 0, h, -1, 0)
+    boards = {root: init_board}  # the boards of the open nodes
+    frontier = [(h, root)]
+    g_values = store.g
+    f_values = store.f
+    closed = store.closed
+
+    while frontier:
+        f, node = heapq.heappop(frontier)
+        if closed[node] or f != f_values[node]:
+            continue  # stale entry, the node was closed or reached more cheaply
+        closed[node] = 1
+        board = boards.pop(node)
+        g = g_values[node]
+        curr_state = State(board, hfn, f, g)
+        if is_goal(curr_state):
+            if stats is not None:
+                stats.peak_explored = len(store)
+            path = replay_moves(init_board, store.moves(node), hfn)
+            return path, g
+        if stats is not None:
+            stats.expanded += 1
+        for succ in successors_fn(curr_state):
+            if stats is not None:
+                stats.generated += 1
+            succ_board = succ.board
+            succ_g = succ.depth
+            key = zobrist_key(succ_board, key_fn)
+            found = store.find(key)
+            if found >= 0 and (closed[found] or g_values[found] <= succ_g):
+                continue
+            succ_f = succ_g + hfn(succ_board)
+            if succ_f >= NODE_MAX_F:
+                continue
+            succ_f = int(succ_f)
+            if found >= 0:
+                g_values[found] = succ_g
+                f_values[found] = succ_f
+                store.parent[found] = node
+                store.move[found] = move_code(board, succ_board)
+            else:
+                found = store.add(key, succ_g, succ_f, node, move_code(board, succ_board))
+            boards[found] = succ_board
+            heapq.heappush(frontier, (succ_f, found))
+        if stats is not None:
+            stats.update_peaks(len(boards), len(store))
+    return [], -1
+
+
+# Number of expansions between two looks at the clock for progress lines.
+PROGRESS_CHECK = 1024
+
+
+# Estimated bytes of memory per state held in memory by external_a_star, which
+# turns its memory budget into a number of states.
+EXTERNAL_STATE_BYTES = 256
+
+# Most sorted runs of the external closed set kept on disk before they are merged into one.
+EXTERNAL_MAX_RUNS = 8
+
+
+class SortedRun:
+    """
+    A run of fixed-size records sorted on their leading key bytes, stored in
+    a file and searched by binary search through a memory map.
+    """
+
+    def __init__(self, filename: str, record_size: int, key_size: int):
+        self.filename = filename
+        self.record_size = record_size
+        self.key_size = key_size
+        self._file = open(filename, 'rb')
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.count = len(self._data) // record_size
+
+    @classmethod
+    def write(cls, filename: str, records, record_size: int, key_size: int):
+        """
+        Write the given records, already sorted, in one sequential pass and
+        return the run.
+        """
+        with open(filename, 'wb') as run_file:
+            for record in records:
+                run_file.write(record)
+        return cls(filename, record_size, key_size)
+
+    def find(self, key: bytes):
+        """
+        Return the record with the given key, or None.
+        """
+        data = self._data
+        size = self.record_size
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            start = middle * size
+            if data[start:start + self.key_size] < key:
+                low = middle + 1
+            else:
+                high = middle
+        start = low * size
+        if low < self.count and data[start:start + self.key_size] == key:
+            return data[start:start + size]
+        return None
+
+    def __iter__(self):
+        data = self._data
+        size = self.record_size
+        return (data[start:start + size] for start in range(0, self.count * size, size))
+
+    def close(self):
+        self._data.close()
+        self._file.close()
+        os.remove(self.filename)
+
+
+class ExternalClosedSet:
+    """
+    The closed set of external_a_star: a dict in memory that is spilled to
+    disk as a sorted run when it grows past its share of the budget; runs
+    are merged into one when there are too many. A record is the state key
+    followed by the state's board and its parent's key.
+    """
+
+    def __init__(self, directory: str, key_size: int):
+        self.directory = directory
+        self.key_size = key_size
+        self.record_size = 3 * key_size
+        self.memory = {}  # key -> board and parent key
+        self.runs = []
+        self._run_count = 0
+
+    def __len__(self):
+        return len(self.memory) + sum(run.count for run in self.runs)
+
+    def get(self, key: bytes):
+        """
+        Return the board and parent key recorded for the given key, or None.
+        """
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+        for run in self.runs:
+            record = run.find(key)
+            if record is not None:
+                return record[self.key_size:]
+        return None
+
+    def __contains__(self, key: bytes):
+        return self.get(key) is not None
+
+    def add(self, key: bytes, value: bytes):
+        self.memory[key] = value
+
+    def _new_run(self, records) -> SortedRun:
+        self._run_count += 1
+        filename = os.path.join(self.directory, 'closed_{}.run'.format(self._run_count))
+        return SortedRun.write(filename, records, self.record_size, self.key_size)
+
+    def spill(self):
+        """
+        Write the in-memory records to disk as a sorted run.
+        """
+        if not self.memory:
+            return
+        self.runs.append(self._new_run(key + value for key, value in sorted(self.memory.items())))
+        self.memory = {}
+        if len(self.runs) > EXTERNAL_MAX_RUNS:
+            # Every key is closed once, so the runs merge without duplicates.
+            merged = self._new_run(heapq.merge(*self.runs))
+            for run in self.runs:
+                run.close()
+            self.runs = [merged]
+
+    def close(self):
+        for run in self.runs:
+            run.close()
+        self.runs = []
+
+
+class ExternalFrontier:
+    """
+    The frontier of external_a_star, one layer of records per f value. A
+    layer is a list in memory until it is spilled to an append-only file,
+    which is read back in chunks when the layer is expanded.
+    """
+
+    def __init__(self, directory: str, record_size: int):
+        self.directory = directory
+        self.record_size = record_size
+        self.layers = {}  # f -> records in memory
+        self.files = {}  # f -> [file name, records read so far, records written]
+        self.memory_size = 0
+
+    def add(self, f: int, record: bytes):
+        self.layers.setdefault(f, []).append(record)
+        self.memory_size += 1
+
+    def min_f(self):
+        """
+        Return the least f with records left, or None when the frontier is empty.
+        """
+        layers = [f for f, records in self.layers.items() if records]
+        layers += [f for f, (_, read, written) in self.files.items() if read < written]
+        return min(layers, default=None)
+
+    def spill(self, above_f: int):
+        """
+        Append the in-memory records of every layer above the given f to the
+        layer files.
+        """
+        for f, records in self.layers.items():
+            if f <= above_f or not records:
+                continue
+            entry = self.files.setdefault(f, [os.path.join(self.directory, 'open_{}.layer'.format(f)), 0, 0])
+            with open(entry[0], 'ab') as layer_file:
+                layer_file.write(b''.join(records))
+            entry[2] += len(records)
+            self.memory_size -= len(records)
+            self.layers[f] = []
+
+    def take(self, f: int, limit: int) -> List[bytes]:
+        """
+        Remove and return the in-memory records of the layer of the given f,
+        or else the next chunk of at most limit records of its file.
+        """
+        records = self.layers.get(f)
+        if records:
+            self.layers[f] = []
+            self.memory_size -= len(records)
+            return records
+        entry = self.files[f]
+        filename, read, written = entry
+        count = min(limit, written - read)
+        with open(filename, 'rb') as layer_file:
+            layer_file.seek(read * self.record_size)
+            data = layer_file.read(count * self.record_size)
+        entry[1] += count
+        if entry[1] == written:
+            os.remove(filename)
+            del self.files[f]
+        size = self.record_size
+        return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+def external_a_star(init_board, hfn, moves='step', memory_budget=None, spill_dir=None, stats=None):
+    """
+    Run the A_star search algorithm given an initial board and a heuristic
+    function, keeping the closed set and the frontier on disk once they
+    outgrow the memory budget, in the style of external A*.
+
+    The frontier is a layer per f value and the layers are expanded in
+    increasing f. The states of a layer are taken in batches; a batch is
+    sorted on the state keys, and its duplicates, within the batch and
+    against the closed set in memory and in the sorted runs on disk, are
+    removed before any of it is expanded (delayed duplicate detection).
+    When the states in memory pass the budget, the closed set is written
+    out as a sorted run and the layers above the current one are appended
+    to their files. Every closed state records its parent's key, so the
+    path is rebuilt by looking up the keys from the goal back.
+
+    If the function finds a goal state, it returns a list of states representing
+    the path from the initial state to the goal state in order and the cost of
+    the solution found.
+    Otherwise, it returns am empty list and -1.
+
+    :param init_board: The initial starting board.
+    :type init_board: Board
+    :param hfn: The heuristic function.
+    :type hfn: Heuristic (a function that consumes a Board and produces a numeric heuristic value)
+    :param moves: 'step' to expand single robot steps, 'push' to expand box pushes.
+    :type moves: str
+    :param memory_budget: Megabytes of states to hold in memory before spilling to disk.
+    :type memory_budget: float
+    :param spill_dir: The directory of the spill files, the system temporary directory by default.
+    :type spill_dir: Optional[str]
+    :param stats: Counters to fill in, if any.
+    :type stats: Optional[SearchStats]
+    :return: (the path to goal state, solution cost)
+    :rtype: List[State], int
+    """
+    successors_fn, key_fn = OPTIMAL_MOVE_MODES[moves]
+    if not isinstance(init_board, PackedBoard):
+        init_board = PackedBoard.from_board(init_board)
+    level = init_board.level
+    width = (len(level.cells) + 7) // 8
+    key_size = 2 * width
+    budget = max(2, int(memory_budget * 1024 * 1024 // EXTERNAL_STATE_BYTES))
+    # No state has a box and a robot on every cell, so this key is free to mark the root.
+    no_parent = b'\xff' * key_size
+
+    def encode(box_bits, robot_bits):
+        # Big-endian, so that byte order sorts like the bitboards.
+        return box_bits.to_bytes(width, 'big') + robot_bits.to_bytes(width, 'big')
+
+    def decode(data):
+        return PackedBoard(level, int.from_bytes(data[:width], 'big'),
+                           int.from_bytes(data[width:key_size], 'big'))
+
+    def state_key(board):
+        if key_fn:
+            return encode(*key_fn(board))
+        return encode(board.box_bits, board.robot_bits)
+
+    h = hfn(init_board)
+    if h == math.inf:
+        return [], -1
+    directory = tempfile.mkdtemp(prefix='sokoban-', dir=spill_dir)
+    closed = ExternalClosedSet(directory, key_size)
+    # A frontier record is the board, the parent's key and g.
+    frontier = ExternalFrontier(directory, 2 * key_size + 4)
+    frontier.add(h, encode(init_board.box_bits, init_board.robot_bits) + no_parent + (0).to_bytes(4, 'big'))
+    try:
+        while True:
+            f = frontier.min_f()
+            if f is None:
+                return [], -1
+            batch = []
+            for record in frontier.take(f, budget):
+                board = decode(record)
+                batch.append((state_key(board), record, board))
+            batch.sort(key=lambda item: item[0])
+
+            previous_key = None
+            for key, record, board in batch:
+                # Copies of a key in one layer share their h and f, hence their g too.
+                if key == previous_key or key in closed:
+                    previous_key = key
+                    if stats is not None:
+                        stats.duplicates += 1
+                    continue
+                previous_key = key
+                board_bits = record[:key_size]
+                closed.add(key, board_bits + record[key_size:2 * key_size])
+                g = int.from_bytes(record[2 * key_size:], 'big')
+
+                curr_state = State(board, hfn, f, g)
+                if is_goal(curr_state):
+                    boards = []
+                    value = board_bits + record[key_size:2 * key_size]
+                    while True:
+                        boards.append(decode(value))
+                        if value[key_size:] == no_parent:
+                            break
+                        value = closed.get(value[key_size:])
+                    boards.reverse()
+                    path = []
+                    for depth, path_board in enumerate(boards):
+                        path.append(State(path_board, hfn, g, depth, path[-1] if path else None))
+                    return path, g
+
+                successors = successors_fn(curr_state)
+                if stats is not None:
+                    stats.expanded += 1
+                    stats.generated += len(successors)
+                for succ in successors:
+                    succ_board = succ.board
+                    if state_key(succ_board) in closed.memory:
+                        continue  # the check against the runs on disk is delayed to its layer
+                    succ_h = hfn(succ_board)
+                    if succ_h == math.inf:
+                        continue
+                    # An inconsistent heuristic may give a lower f; it still belongs to this layer.
+                    frontier.add(max(f, succ.depth + succ_h),
+                                 encode(succ_board.box_bits, succ_board.robot_bits) + key
+                                 + succ.depth.to_bytes(4, 'big'))
+
+                if len(closed.memory) + frontier.memory_size > budget:
+                    frontier.spill(f)
+                    if len(closed.memory) + frontier.memory_size > budget // 2:
+                        closed.spill()
+                if stats is not None:
+                    stats.update_peaks(frontier.memory_size, len(closed.memory))
+    finally:
+        closed.close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class SearchStats:
+    """
+    Counters describing the work and memory of a search.
+
+    With profile set, the searches that support it also time their calls to
+    the successor function, the heuristic and the state-key computation;
+    with progress set to a number of seconds, a progress line is printed at
+    that interval while the search runs.
+    """
+
+    def __init__(self, profile=False, progress=None):
+        self.generated = 0  # successor states created
+        self.expanded = 0  # states whose successors were generated
+        self.duplicates = 0  # successors dropped as no better than a known state
+        self.peak_frontier = 0  # most states waiting in the frontier at once
+        self.peak_explored = 0  # most keys held in the explored set at once
+        self.successor_time = 0.0  # seconds spent generating successors (profile only)
+        self.heuristic_time = 0.0  # seconds spent in the heuristic (profile only)
+        self.hash_time = 0.0  # seconds spent building state keys (profile only)
+        self.peak_memory = None  # peak traced Python memory in bytes, if traced
+        self.elapsed = None  # seconds the whole search took, once finished
+
+        self._profile = profile
+        self._progress = progress
+        self._start = time.time()
+        self._next_report = self._start + progress if progress else None
+        self._last_expanded = 0
+
+    def timed(self, fn, counter: str):
+        """
+        Return the given function, wrapped to add its running time to the
+        named counter when profiling.
+        """
+        if not self._profile or fn is None:
+            return fn
+        clock = time.perf_counter
+        stats = self
+
+        def timed_fn(*args):
+            start = clock()
+            try:
+                return fn(*args)
+            finally:
+                setattr(stats, counter, getattr(stats, counter) + clock() - start)
+
+        return timed_fn
+
+    def timed_key(self, key_fn):
+        """
+        Return the given state-key function, wrapped to add its running time
+        to hash_time when profiling. Step boards are their own keys, so in
+        step mode key_fn is None; the wrapper then builds the hash and the
+        frozenset key that __eq__ compares, so that their cost is counted too.
+        """
+        if not self._profile:
+            return key_fn
+        if key_fn is None:
+
+            def key_fn(board):
+                hash(board)
+                board.key()
+                return board
+
+        return self.timed(key_fn, 'hash_time')
+
+    def update_peaks(self, frontier_size: int, explored_size: int):
+        """
+        Record the current frontier and explored-set sizes, and print a
+        progress line when one is due.
+        """
+        if frontier_size > self.peak_frontier:
+            self.peak_frontier = frontier_size
+        if explored_size > self.peak_explored:
+            self.peak_explored = explored_size
+        if self._next_report is not None and self.expanded % PROGRESS_CHECK == 0:
+            now = time.time()
+            if now >= self._next_report:
+                rate = (self.expanded - self._last_expanded) / (now - self._next_report + self._progress)
+                print('[{:.0f}s] {} expanded, {:.0f} nodes/s, frontier {}, explored {}'.format(
+                    now - self._start, self.expanded, rate, frontier_size, explored_size), flush=True)
+                self._last_expanded = self.expanded
+                self._next_report = now + self._progress
+
+    def as_dict(self) -> dict:
+        return {name: value for name, value in vars(self).items() if not name.startswith('_')}
+
+    def __str__(self):
+        lines = []
+        for name, value in self.as_dict().items():
+            if value is None or name.endswith('_time') and not self._profile:
+                continue
+            if isinstance(value, float):
+                value = '{:.3f}'.format(value)
+            lines.append('{}: {}'.format(name.replace('_', ' ').capitalize(), value))
+        return '\n'.join(lines)
+
+
+def greedy_best_first(init_board, hfn, moves='step', stats=None):
+    """
+    Run the greedy best-first search algorithm given an initial board and a
+    heuristic function. States are ordered on their heuristic value only,
+    which usually finds a solution fast but gives no bound on its cost.
+
+    If the function finds a goal state, it returns a list of states representing
+    the path from the initial state to the goal state in order and the cost of
+    the solution found.
+    Otherwise, it returns am empty list and -1.
+
+    :param init_board: The initial starting board.
+    :type init_board: Board
+    :param hfn: The heuristic function.
+    :type hfn: Heuristic (a function that consumes a Board and produces a numeric heuristic value)
+    :param moves: 'step' to expand single robot steps, 'push' to expand box pushes.
+    :type moves: str
+    :param stats: Counters to fill in, if any.
+    :type stats: Optional[SearchStats]
+    :return: (the path to goal state, solution cost)
+    :rtype: List[State], int
+    """
+    successors_fn, key_fn = MOVE_MODES[moves]
+    if stats is None:
+        stats = SearchStats()
+    successors_fn = stats.timed(successors_fn, 'successor_time')
+    key_fn = stats.timed_key(key_fn)
+    hfn = stats.timed(hfn, 'heuristic_time')
+    init_state = State(init_board, hfn, hfn(init_board), 0)
+    frontier = [(init_state.f, init_state)]
+    explored = set()
+
+    while frontier:
+        _, curr_state = heapq.heappop(frontier)
+        key = key_fn(curr_state.board) if key_fn else curr_state.board
+        if key in explored:
+            continue
+        explored.add(key)
+        if is_goal(curr_state):
+            return get_path(curr_state), curr_state.depth
+        stats.expanded += 1
+        for succ in successors_fn(curr_state):
+            stats.generated += 1
+            succ.f = succ.hfn(succ.board)
+            if succ.f < math.inf:
+                heapq.heappush(frontier, (succ.f, succ))
+        stats.update_peaks(len(frontier), len(explored))
+    return [], -1
+
+
+# Default number of entries of the IDA* and beam search transposition table.
+TABLE_SIZE = 1 << 20
+
+
+class TranspositionTable:
+    """
+    A fixed-size, direct-mapped transposition table for IDA* and beam
+    search. It maps a board to the lowest depth it was reached with during
+    the current iteration, so memory stays bounded by the number of slots
+    no matter how large the search grows.
+
+    A slot holds the Zobrist hash of its board and the board packed as box
+    and robot bitboards of a fixed number of bytes, so the table takes
+    size * (24 + 2 * bytes per bitboard) bytes whatever the boards are.
+
+    Replacement policy: a slot holding an entry from an earlier iteration is
+    always overwritten; a slot holding another state from this iteration is
+    only overwritten by a shallower state, which prunes a larger subtree.
+    """
+
+    def __init__(self, level: Level, size: int = TABLE_SIZE):
+        """
+        :param level: the level of the boards.
+        :type level: Level
+        :param size: the number of slots.
+        :type size: int
+        """
+        self.size = size
+        self.width = (len(level.cells) + 7) // 8
+        self.hashes = array('Q', [0]) * size
+        self.keys = bytearray(size * 2 * self.width)
+        self.depths = array('l', [0]) * size
+        self.stamps = array('l', [0]) * size
+        self.iteration = 0
+        self.filled = 0
+
+    def new_iteration(self):
+        """
+        Start a new iteration, invalidating every entry in O(1).
+        """
+        self.iteration += 1
+        self.filled = 0
+
+    def visit(self, board, depth: int) -> bool:
+        """
+        Record that the given board was reached at the given depth. Return
+        False if it was already reached at most that deep in this iteration,
+        i.e. if it need not be expanded again.
+        """
+        return self.visit_bits(board.zobrist, board.box_bits, board.robot_bits, depth)
+
+    def visit_bits(self, zobrist: int, box_bits: int, robot_bits: int, depth: int) -> bool:
+        """
+        Same as visit, for a board given by its Zobrist hash and bitboards.
+        """
+        slot = zobrist % self.size
+        width = self.width
+        key = box_bits.to_bytes(width, 'little') + robot_bits.to_bytes(width, 'little')
+        start = slot * 2 * width
+        current = self.stamps[slot] == self.iteration
+        if current and self.hashes[slot] == zobrist and self.keys[start:start + 2 * width] == key:
+            if depth >= self.depths[slot]:
+                return False
+        elif current and depth > self.depths[slot]:
+            return True
+        if not current:
+            self.filled += 1
+        self.hashes[slot] = zobrist
+        self.keys[start:start + 2 * width] = key
+        self.depths[slot] = depth
+        self.stamps[slot] = self.iteration
+        return True
+
+
+# Default number of states kept per layer by beam search.
+BEAM_WIDTH = 100
+
+
+def beam_search(init_board, hfn, moves='step', beam_width=BEAM_WIDTH, table_size=TABLE_SIZE, stats=None):
+    """
+    Run the beam search algorithm given an initial board and a heuristic
+    function. The search proceeds one depth layer at a time and keeps only
+    the beam_width successors with the lowest heuristic values, so the
+    frontier never holds more than beam_width states. It is incomplete: a
+    solution may be pruned away.
+
+    States already reached are detected with a transposition table of fixed
+    size, so memory stays bounded however deep the search goes. A state
+    whose slot is taken by another one is not recorded and may be
+    generated again in a later layer, so the search also stops when a
+    layer records no new state, which happens at the latest once every
+    slot is taken.
+
+    If the function finds a goal state, it returns a list of states representing
+    the path from the initial state to the goal state in order and the cost of
+    the solution found.
+    Otherwise, it returns am empty list and -1.
+
+    :param init_board: The initial starting board.
+    :type init_board: Board
+    :param hfn: The heuristic function used to rank and prune states.
+    :type hfn: Heuristic (a function that consumes a Board and produces a numeric heuristic value)
+    :param moves: 'step' to expand single robot steps, 'push' to expand box pushes.
+    :type moves: str
+    :param beam_width: The number of states kept per layer.
+    :type beam_width: int
+    :param table_size: The number of entries of the transposition table.
+    :type table_size: int
+    :param stats: Counters to fill in, if any.
+    :type stats: Optional[SearchStats]
+    :return: (the path to goal state, solution cost)
+    :rtype: List[State], int
+    """
+    successors_fn, key_fn = MOVE_MODES[moves]
+    if stats is None:
+        stats = SearchStats()
+    successors_fn = stats.timed(successors_fn, 'successor_time')
+    key_fn = stats.timed_key(key_fn)
+    hfn = stats.timed(hfn, 'heuristic_time')
+    init_state = State(init_board, hfn, hfn(init_board), 0)
+    if is_goal(init_state):
+        return [init_state], 0
+    table = TranspositionTable(init_board.level, table_size)
+    table.new_iteration()
+
+    def visit(board, key, depth):
+        if key_fn is None:
+            return table.visit(board, depth)
+        box_bits, robot_bits = key
+        return table.visit_bits(robot_zobrist(board, robot_bits), box_bits, robot_bits, depth)
+
+    visit = stats.timed(visit, 'hash_time')
+    visit(init_board, key_fn(init_board) if key_fn else init_board, 0)
+    layer = [init_state]
+    layer_index = 0
+
+    while layer:
+        # The table is keyed on the layer rather than the step depth, so a
+        # state seen in any earlier layer is a duplicate.
+        layer_index += 1
+        filled = table.filled
+        candidates = []
+        for curr_state in layer:
+            stats.expanded += 1
+            for succ in successors_fn(curr_state):
+                stats.generated += 1
+                key = key_fn(succ.board) if key_fn else succ.board
+                if not visit(succ.board, key, layer_index):
+                    stats.duplicates += 1
+                    continue
+                if is_goal(succ):
+                    return get_path(succ), succ.depth
+                succ.f = succ.hfn(succ.board)
+                if succ.f < math.inf:
+                    candidates.append(succ)
+        # Only the table is used for duplicate detection; it has a fixed size.
+        stats.update_peaks(len(candidates), table.filled)
+        if table.filled == filled:
+            break
+        layer = heapq.nsmallest(beam_width, candidates, key=lambda state: (state.f, state.depth))
+    return [], -1
+
+
+# Default initial weight and weight decrement of the anytime search.
+ANYTIME_WEIGHT = 3.0
+ANYTIME_WEIGHT_STEP = 0.5
+
+
+def anytime_a_star(init_board, hfn, moves='step', time_limit=None,
+                   weight=ANYTIME_WEIGHT, weight_step=ANYTIME_WEIGHT_STEP, on_solution=None, stats=None):
+    """
+    Run the anytime repairing A* (ARA*) search algorithm given an initial
+    board and a heuristic function.
+
+    Starts as a weighted A* ordered on f = g + weight * h, which finds a
+    first solution quickly, then repeatedly lowers the weight and improves
+    the solution. States whose cost improved after they were expanded are
+    kept aside and reopened for the next weight instead of searching from
+    scratch. Once the weight reaches 1 and the search completes, the
+    solution is optimal; when the time limit expires first, the best
+    solution so far is returned.
+
+    If the function finds a goal state, it returns a list of states representing
+    the path from the initial state to the goal state in order and the cost of
+    the best solution found.
+    Otherwise, it returns am empty list and -1.
+
+    :param init_board: The initial starting board.
+    :type init_board: Board
+    :param hfn: The heuristic function.
+    :type hfn: Heuristic (a function that consumes a Board and produces a numeric heuristic value)
+    :param moves: 'step' to expand single robot steps, 'push' to expand box pushes.
+    :type moves: str
+    :param time_limit: Seconds after which the best solution so far is returned, None for no limit.
+    :type time_limit: Optional[float]
+    :param weight: The initial heuristic weight.
+    :type weight: float
+    :param weight_step: How much the weight is lowered after each solution; 0 runs a
+                        single weighted A* pass.
+    :type weight_step: float
+    :param on_solution: Called as on_solution(path, cost, weight) as soon as an improved solution is found.
+    :type on_solution: Optional[Callable]
+    :param stats: Counters to fill in, if any.
+    :type stats: Optional[SearchStats]
+    :return: (the path to goal state, solution cost)
+    :rtype: List[State], int
+    """
+    successors_fn, key_fn = OPTIMAL_MOVE_MODES[moves]
+    if stats is None:
+        stats = SearchStats()
+    successors_fn = stats.timed(successors_fn, 'successor_time')
+    key_fn = stats.timed_key(key_fn)
+    hfn = stats.timed(hfn, 'heuristic_time')
+    deadline = None if time_limit is None else time.time() + time_limit
+
+    init_state = State(init_board, hfn, 0, 0)
+    init_key = key_fn(init_board) if key_fn else init_board
+    h_values = {init_key: hfn(init_board)}
+    best_g = {init_key: 0}
+    init_state.f = weight * h_values[init_key]
+    frontier = [(init_state.f, init_state)]
+    inconsistent = {}
+    best_state = None
+    best_cost = math.inf
+    if is_goal(init_state):
+        best_state, best_cost = init_state, 0
+        if on_solution is not None:
+            on_solution([init_state], 0, weight)
+
+    while True:
+        # Improve the solution under the current weight.
+        explored = set()
+        while frontier and frontier[0][0] < best_cost:
+            if deadline is not None and time.time() > deadline:
+                break
+            _, curr_state = heapq.heappop(frontier)
+            key = key_fn(curr_state.board) if key_fn else curr_state.board
+            if key in explored or curr_state.depth > best_g[key]:
+                continue
+            explored.add(key)
+            stats.expanded += 1
+            for succ in successors_fn(curr_state):
+                stats.generated += 1
+                succ_key = key_fn(succ.board) if key_fn else succ.board
+                if succ.depth >= best_g.get(succ_key, math.inf):
+                    stats.duplicates += 1
+                    continue
+                best_g[succ_key] = succ.depth
+                if succ_key not in h_values:
+                    h_values[succ_key] = succ.hfn(succ.board)
+                if h_values[succ_key] == math.inf:
+                    continue
+                if is_goal(succ) and succ.depth < best_cost:
+                    best_state, best_cost = succ, succ.depth
+                    if on_solution is not None:
+                        on_solution(get_path(best_state), best_cost, weight)
+                if succ_key in explored:
+                    inconsistent[succ_key] = succ
+                else:
+                    succ.f = succ.depth + weight * h_values[succ_key]
+                    heapq.heappush(frontier, (succ.f, succ))
+            stats.update_peaks(len(frontier), len(explored))
+
+        if (deadline is not None and time.time() > deadline) or weight <= 1 or weight_step <= 0:
+            break
+
+        # Lower the weight and reopen the inconsistent states.
+        weight = max(1.0, weight - weight_step)
+        states = [state for _, state in frontier] + list(inconsistent.values())
+        inconsistent = {}
+        frontier = []
+        queued = set()
+        for state in states:
+            key = key_fn(state.board) if key_fn else state.board
+            if state.depth == best_g[key] and key not in queued:
+                queued.add(key)
+                state.f = state.depth + weight * h_values[key]
+                frontier.append((state.f, state))
+        heapq.heapify(frontier)
+
+    if best_state is None:
+        return [], -1
+    return get_path(best_state), best_cost
+
+
+def ida_star(init_board, hfn, moves='step', table_size=TABLE_SIZE, stats=None):
+    """
+    Run the IDA* search algorithm given an initial board and a heuristic function.
+
+    Runs depth-first searches bounded by increasing f values. Besides the
+    current path, the only memory used is a transposition table of fixed
+    size, so memory stays bounded however large the level is.
+
+    If the function finds a goal state, it returns a list of states representing
+    the path from the initial state to the goal state in order and the cost of
+    the solution found.
+    Otherwise, it returns am empty list and -1.
+
+    :param init_board: The initial starting board.
+    :type init_board: Board
+    :param hfn: The heuristic function.
+    :type hfn: Heuristic (a function that consumes a Board and produces a numeric heuristic value)
+    :param moves: 'step' to expand single robot steps, 'push' to expand box pushes.
+    :type moves: str
+    :param table_size: The number of entries of the transposition table.
+    :type table_size: int
+    :param stats: Counters to fill in, if any.
+    :type stats: Optional[SearchStats]
+    :return: (the path to goal state, solution cost)
+    :rtype: List[State], int
+    """
+    # Pushes leave every robot on an exact cell, so both move modes key the
+    # table on the board itself, as push_cell_key would.
+    successors_fn, _ = OPTIMAL_MOVE_MODES[moves]
+    if stats is None:
+        stats = SearchStats()
+    successors_fn = stats.timed(successors_fn, 'successor_time')
+    hfn = stats.timed(hfn, 'heuristic_time')
+    init_state = State(init_board, hfn, hfn(init_board), 0)
+    table = TranspositionTable(init_board.level, table_size)
+    visit = stats.timed(table.visit, 'hash_time')
+    bound = init_state.f
+
+    while bound < math.inf:
+        table.new_iteration()
+        next_bound = math.inf
+        frontier = [init_state]
+        while frontier:
+            curr_state = frontier.pop()
+            if curr_state.f > bound:
+                next_bound = min(next_bound, curr_state.f)
+                continue
+            if not visit(curr_state.board, curr_state.depth):
+                stats.duplicates += 1
+                continue
+            if is_goal(curr_state):
+                return get_path(curr_state), curr_state.depth
+            successors = successors_fn(curr_state)
+            for succ in successors:
+                succ.f = succ.depth + succ.hfn(succ.board)
+            # Push the most promising successor last so that it is searched first.
+            successors.sort(key=lambda succ: succ.f, reverse=True)
+            frontier.extend(successors)
+            stats.expanded += 1
+            stats.generated += len(successors)
+            # Only the current path and its siblings are held; the table has a fixed size.
+            stats.update_peaks(len(frontier), 0)
+        bound = next_bound
+    return [], -1
+
+
+def _goal_boards(init_board):
+    """
+    Helper, return one board per region a robot can stand in when all boxes
+    are on storage points: the start states of the backward search.
+    """
+    level = init_board.level
+    storage_bits = level.storage_bits
+    boards = []
+    seen = storage_bits
+    for cell in range(len(level.cells)):
+        if seen >> cell & 1:
+            continue
+        distances, _ = robot_reach(level, cell, storage_bits)
+        for reached in distances:
+            seen |= 1 << reached
+        boards.append(PackedBoard(level, storage_bits, 1 << cell))
+    return boards
+
+
+def _backward_heuristic(init_board):
+    """
+    Helper, return the heuristic of the backward search: the sum of the
+    Manhattan distances between each box and its closest box position on
+    the initial board.
+    """
+    targets = list(init_board.boxes)
+
+    def heuristic(board):
+        total_distance = 0
+        for box in board.boxes:
+            total_distance += min(abs(box[0] - target[0]) + abs(box[1] - target[1])
+                                  for target in targets)
+        return total_distance
+    return heuristic
+
+
+def _join_paths(forward_state, backward_state):
+    """
+    Helper, join the forward path to forward_state and the backward path to
+    backward_state, which share a push key, into one path of states that
+    differ by a walk and at most one push. The pulls of the backward path
+    are replayed as pushes from the board of forward_state, so the robot
+    walks from where it actually stands to each push.
+    """
+    path = get_path(forward_state)
+    level = backward_state.board.level
+    cells = level.cells
+    neighbours = level.neighbours
+    board = forward_state.board
+    state = backward_state
+    while state.parent is not None:
+        # Replaying the pull that led to state as a push yields the parent's
+        # boxes, with the robot on the cell the box was pulled to.
+        parent = state.parent
+        box = bit_indices(state.board.box_bits & ~parent.board.box_bits)[0]
+        box_next_move = bit_indices(parent.board.box_bits & ~state.board.box_bits)[0]
+        board = init_new_board(board, board.robots[0], cells[box], cells[box], cells[box_next_move])
+        path.append(State(board, forward_state.hfn, 0, 0))
+        state = parent
+    return path
+
+
+def bidirectional(init_board, hfn, time_limit=None, stats=None):
+    """
+    Run a bidirectional search over box pushes given an initial board and a
+    heuristic function.
+
+    A forward best-first search pushes boxes from the initial board while a
+    backward best-first search pulls boxes away from the storage points,
+    starting from every region the robot may end in. The side with the
+    smaller frontier is expanded next. Whenever a state of one side has the
+    same push key as a state of the other, the two paths are joined into a
+    solution, and the search goes on until the least f of the side being
+    expanded is no smaller than the cheapest solution so far, or the time
+    limit expires. States that share a push key are merged, so the solution
+    is not guaranteed to be optimal.
+
+    Only levels with one robot and as many boxes as storage points are
+    supported; others raise a ValueError.
+
+    If the function finds a goal state, it returns a list of states representing
+    the path from the initial state to the goal state in order, one robot step
+    at a time, and the cost of the solution found.
+    Otherwise, it returns am empty list and -1.
+
+    :param init_board: The initial starting board.
+    :type init_board: Board
+    :param hfn: The heuristic function of the forward search.
+    :type hfn: Heuristic (a function that consumes a Board and produces a numeric heuristic value)
+    :param time_limit: Seconds after which the best solution so far is returned, None for no limit.
+    :type time_limit: Optional[float]
+    :param stats: Counters to fill in, if any.
+    :type stats: Optional[SearchStats]
+    :return: (the path to goal state, solution cost)
+    :rtype: List[State], int
+    """
+    if len(init_board.robots) != 1:
+        raise ValueError('bidirectional search needs a level with one robot, not {}'.format(
+            len(init_board.robots)))
+    if len(init_board.boxes) != len(init_board.storage):
+        raise ValueError('bidirectional search needs as many boxes as storage points, not {} and {}'.format(
+            len(init_board.boxes), len(init_board.storage)))
+
+    if stats is None:
+        stats = SearchStats()
+    key_fn = stats.timed_key(push_key)
+    hfn = stats.timed(hfn, 'heuristic_time')
+    back_hfn = stats.timed(_backward_heuristic(init_board), 'heuristic_time')
+    deadline = None if time_limit is None else time.time() + time_limit
+    init_state = State(init_board, hfn, hfn(init_board), 0)
+    sides = []
+    for states, successors_fn in (([init_state], get_push_successors),
+                                  ([State(board, back_hfn, back_hfn(board), 0)
+                                    for board in _goal_boards(init_board)], get_pull_successors)):
+        frontier = []
+        seen = {}
+        for state in states:
+            heapq.heappush(frontier, (state.f, state))
+            seen.setdefault(key_fn(state.board), state)
+        sides.append((frontier, seen, stats.timed(successors_fn, 'successor_time')))
+
+    if is_goal(init_state):
+        return [init_state], 0
+
+    best_path, best_cost = [], math.inf
+    forward, backward = sides[0][0], sides[1][0]
+    while forward and backward:
+        if deadline is not None and time.time() > deadline:
+            break
+        side = 0 if len(forward) <= len(backward) else 1
+        frontier, seen, successors_fn = sides[side]
+        other_seen = sides[1 - side][1]
+        _, curr_state = heapq.heappop(frontier)
+        if curr_state.f >= best_cost:
+            # No path through a state of this side's frontier is cheaper.
+            break
+        if seen[key_fn(curr_state.board)] is not curr_state:
+            continue  # a cheaper copy of it was queued since
+        stats.expanded += 1
+        for succ in successors_fn(curr_state):
+            stats.generated += 1
+            succ_key = key_fn(succ.board)
+            meet = other_seen.get(succ_key)
+            if meet is not None:
+                # A forward goal meets the backward start of its region and
+                # joins to the forward path alone, without a trailing walk.
+                if side == 0:
+                    path = expand_push_path(_join_paths(succ, meet))
+                else:
+                    path = expand_push_path(_join_paths(meet, succ))
+                if len(path) - 1 < best_cost:
+                    best_path, best_cost = path, len(path) - 1
+            prev_state = seen.get(succ_key)
+            if prev_state is not None and prev_state.depth <= succ.depth:
+                stats.duplicates += 1
+                continue
+            h = succ.hfn(succ.board)
+            if h == math.inf:
+                continue
+            seen[succ_key] = succ
+            succ.f = succ.depth + h
+            heapq.heappush(frontier, (succ.f, succ))
+        stats.update_peaks(len(forward) + len(backward), len(sides[0][1]) + len(sides[1][1]))
+    if not best_path:
+        return [], -1
+    return best_path, best_cost
+
+
+# Number of successors a HDA* worker buffers per destination before sending them.
+HDA_BATCH_SIZE = 64
+
+# Seconds between two termination probes of the HDA* coordinator.
+HDA_PROBE_INTERVAL = 0.01
+
+# Seconds the HDA* coordinator waits for a message before checking that its
+# workers are still alive.
+HDA_POLL_TIMEOUT = 1.0
+
+
+def _hda_worker(index, workers, init_board, hfn, moves, inboxes, results, batch_size):
+    """
+    Helper, the body of one HDA* worker process.
+
+    The worker owns the states whose key hashes to its index: it keeps their
+    open list and best known g, expands them, and sends every successor to
+    its owner in batches. A node travels as (box bits, robot bits, Zobrist
+    hash, g, parent bits), where the parent bits identify the parent board.
+
+    Messages in the inbox:
+    ('nodes', [node, ...])  successors owned by this worker
+    ('incumbent', cost)     cost of the best solution found so far
+    ('probe', round)        request for a status reply, used to detect termination
+    ('parent', bits)        request for the parent of an owned board, used to rebuild the path
+    ('stop',)               end of the search
+    """
+    successors_fn, key_fn = OPTIMAL_MOVE_MODES[moves]
+    level = init_board.level
+    inbox = inboxes[index]
+    records = {}  # key -> [g, h, box bits, robot bits]
+    # Parent bits of every board accepted, by exact board: in push mode
+    # several boards share one key, and the path must follow real pushes.
+    parents = {}
+    frontier = []  # (f, -g, counter, key)
+    counter = 0
+    buffers = [[] for _ in range(workers)]
+    sent = received = expanded = generated = 0
+    peak_frontier = peak_records = 0
+    incumbent = math.inf
+
+    def owner(key):
+        return hash(key) % workers
+
+    def add(node):
+        nonlocal counter
+        box_bits, robot_bits, zobrist, g, parent = node
+        board = PackedBoard(level, box_bits, robot_bits, zobrist)
+        key = key_fn(board) if key_fn else board
+        record = records.get(key)
+        if record is not None and g >= record[0]:
+            return
+        h = record[1] if record is not None else hfn(board)
+        records[key] = [g, h, box_bits, robot_bits]
+        parents[(box_bits, robot_bits)] = parent
+        if g + h < incumbent:
+            counter += 1
+            heapq.heappush(frontier, (g + h, -g, counter, key))
+
+    def flush():
+        nonlocal sent
+        for destination, buffer in enumerate(buffers):
+            if buffer:
+                inboxes[destination].put(('nodes', buffer))
+                buffers[destination] = []
+                sent += 1
+
+    while True:
+        idle = not frontier or frontier[0][0] >= incumbent
+        if idle:
+            flush()
+        try:
+            message = inbox.get(block=idle, timeout=HDA_PROBE_INTERVAL)
+        except queue.Empty:
+            message = None
+        while message is not None:
+            kind = message[0]
+            if kind == 'nodes':
+                received += 1
+                for node in message[1]:
+                    add(node)
+            elif kind == 'incumbent':
+                incumbent = min(incumbent, message[1])
+            elif kind == 'probe':
+                flush()
+                busy = bool(frontier) and frontier[0][0] < incumbent
+                results.put(('status', message[1], index, not busy, sent, received,
+                             expanded, generated, peak_frontier, peak_records))
+            elif kind == 'parent':
+                results.put(('parent', parents[message[1]]))
+            elif kind == 'stop':
+                return
+            try:
+                message = inbox.get_nowait()
+            except queue.Empty:
+                message = None
+
+        # Expand a batch of states between two looks at the inbox.
+        for _ in range(batch_size):
+            if not frontier or frontier[0][0] >= incumbent:
+                break
+            peak_frontier = max(peak_frontier, len(frontier))
+            peak_records = max(peak_records, len(records))
+            f, neg_g, _, key = heapq.heappop(frontier)
+            record = records[key]
+            if -neg_g != record[0]:
+                continue  # stale entry, the state was reached again more cheaply
+            g, h, box_bits, robot_bits = record
+            board = PackedBoard(level, box_bits, robot_bits)
+            curr_state = State(board, hfn, f, g)
+            if is_goal(curr_state):
+                incumbent = g
+                results.put(('goal', g, (box_bits, robot_bits)))
+                continue
+            expanded += 1
+            for succ in successors_fn(curr_state):
+                generated += 1
+                succ_board = succ.board
+                node = (succ_board.box_bits, succ_board.robot_bits, succ_board.zobrist,
+                        succ.depth, (box_bits, robot_bits))
+                destination = owner(key_fn(succ_board) if key_fn else succ_board)
+                if destination == index:
+                    add(node)
+                else:
+                    buffers[destination].append(node)
+                    if len(buffers[destination]) >= batch_size:
+                        inboxes[destination].put(('nodes', buffers[destination]))
+                        buffers[destination] = []
+                        sent += 1
+
+
+def hda_star(init_board, hfn, moves='step', workers=None, batch_size=HDA_BATCH_SIZE, stats=None):
+    """
+    Run hash-distributed A* (HDA*) given an initial board and a heuristic
+    function, with one search spread over several worker processes.
+
+    Every state is owned by the worker its key hashes to; each worker keeps
+    its own open list and best known g values, expands its states in A*
+    order and sends successors to their owners in batches over queues.
+    Goals found by any worker set an incumbent cost that the coordinator
+    broadcasts. The search ends when no worker holds a state with f below
+    the incumbent and no batch is in flight, which is confirmed by two
+    consecutive probe waves with matching message counts; the incumbent is
+    then optimal. If a worker dies, a RuntimeError is raised and the other
+    workers are stopped.
+
+    If the function finds a goal state, it returns a list of states representing
+    the path from the initial state to the goal state in order and the cost of
+    the solution found.
+    Otherwise, it returns am empty list and -1.
+
+    :param init_board: The initial starting board.
+    :type init_board: Board
+    :param hfn: The heuristic function.
+    :type hfn: Heuristic (a function that consumes a Board and produces a numeric heuristic value)
+    :param moves: 'step' to expand single robot steps, 'push' to expand box pushes.
+    :type moves: str
+    :param workers: The number of worker processes, one per CPU by default.
+    :type workers: Optional[int]
+    :param batch_size: The number of successors sent to another worker at once.
+    :type batch_size: int
+    :param stats: Counters to fill in, if any.
+    :type stats: Optional[SearchStats]
+    :return: (the path to goal state, solution cost)
+    :rtype: List[State], int
+    """
+    if workers is None:
+        workers = os.cpu_count()
+    _, key_fn = OPTIMAL_MOVE_MODES[moves]
+    if not isinstance(init_board, PackedBoard):
+        init_board = PackedBoard.from_board(init_board)
+    level = init_board.level
+
+    inboxes = [multiprocessing.Queue() for _ in range(workers)]
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_hda_worker,
+                                         args=(index, workers, init_board, hfn, moves,
+                                               inboxes, results, batch_size),
+                                         daemon=True)
+                 for index in range(workers)]
+    for process in processes:
+        process.start()
+
+    def receive():
+        # A worker that died, e.g. on an exception, never replies: rather
+        # than wait for it forever, check the workers whenever none replies.
+        while True:
+            try:
+                return results.get(timeout=HDA_POLL_TIMEOUT)
+            except queue.Empty:
+                for index, process in enumerate(processes):
+                    if process.exitcode is not None:
+                        raise RuntimeError('HDA* worker {} exited with code {}'.format(index, process.exitcode))
+
+    key = key_fn(init_board) if key_fn else init_board
+    inboxes[hash(key) % workers].put(('nodes', [(init_board.box_bits, init_board.robot_bits,
+                                                 init_board.zobrist, 0, None)]))
+    sent = 1  # node batches sent by the coordinator
+    incumbent = math.inf
+    goal = None
+    last_wave = None
+    probe = 0
+    try:
+        while True:
+            probe += 1
+            for inbox in inboxes:
+                inbox.put(('probe', probe))
+            replies = []
+            while len(replies) < workers:
+                message = receive()
+                if message[0] == 'goal':
+                    if message[1] < incumbent:
+                        incumbent, goal = message[1], message[2]
+                        for inbox in inboxes:
+                            inbox.put(('incumbent', incumbent))
+                        last_wave = None
+                elif message[0] == 'status' and message[1] == probe:
+                    replies.append(message)
+            wave = (sum(reply[4] for reply in replies) + sent,
+                    sum(reply[5] for reply in replies))
+            if all(reply[3] for reply in replies) and wave[0] == wave[1]:
+                if wave == last_wave:
+                    break
+                last_wave = wave
+            else:
+                last_wave = None
+                time.sleep(HDA_PROBE_INTERVAL)
+
+        if stats is not None:
+            stats.expanded += sum(reply[6] for reply in replies)
+            stats.generated += sum(reply[7] for reply in replies)
+            # Per-worker peaks need not coincide, so their sum is an upper bound.
+            stats.update_peaks(sum(reply[8] for reply in replies),
+                               sum(reply[9] for reply in replies))
+
+        if goal is None:
+            return [], -1
+        # Follow the parent links from the goal back to the initial board.
+        boards = []
+        bits = goal
+        while bits is not None:
+            board = PackedBoard(level, *bits)
+            boards.append(board)
+            key = key_fn(board) if key_fn else board
+            inboxes[hash(key) % workers].put(('parent', bits))
+            message = receive()
+            while message[0] != 'parent':
+                message = receive()
+            bits = message[1]
+        boards.reverse()
+        path = []
+        for depth, board in enumerate(boards):
+            path.append(State(board, hfn, incumbent, depth, path[-1] if path else None))
+        return path, incumbent
+    finally:
+        for inbox in inboxes:
+            inbox.put(('stop',))
+        for process in processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+
+
+def heuristic_basic(board):
+    """
+    Returns the heuristic value for the given board
+    based on the Manhattan Distance Heuristic function.
+
+    Returns the sum of the Manhattan distances between each box 
+    and its closest storage point.
+
+    :param board: The current board.
+    :type board: Board
+    :return: The heuristic value.
+    :rtype: int
+    """
+    total_distance = 0
+    for box in board.boxes:
+        min_distance = board.height + board.width
+        for storage in board.storage:
+            distance = abs(box[0] - storage[0]) + abs(box[1] - storage[1])
+            if distance < min_distance:
+                min_distance = distance
+        total_distance += min_distance
+    return total_distance
+
+
+def check_deadlock(box: tuple, level: Level) -> bool:
+    """
+    Helper, check if the given box is in a deadlock state, i.e. on a dead
+    square from which it can never reach a storage point.
+
+    :param box: The box to check.
+    :type box: tuple
+    :param level: The static layer of the board.
+    :type level: Level
+    :return: True if the box is in a deadlock state, False otherwise.
+    """
+    return bool(level.dead_bits >> level.index[box] & 1)
+
+
+def heuristic_advanced(board):
+    """
+    An advanced heuristic of your own choosing and invention.
+
+    Returns infinity if a box is on a dead square, otherwise the sum of the
+    push distances between each box and its closest storage point. Push
+    distances account for walls, so this is never smaller than
+    heuristic_basic.
+
+    :param board: The current board.
+    :type board: Board
+    :return: The heuristic value.
+    :rtype: int
+    """
+    level = board.level
+    storage_bits = level.storage_bits
+    table = level.push_distances
+    size = len(level.cells)
+    total_distance = 0
+    for box in board.boxes:
+        if storage_bits >> level.index[box] & 1:
+            continue
+        if check_deadlock(box, level):
+            return math.inf
+        total_distance += min(table[level.index[box]::size])
+    return total_distance
+
+
+# Number of box configurations whose matching is kept per level before the cache is reset.
+MATCHING_CACHE_SIZE = 200000
+
+# Stand-in for an infinite assignment cost inside the matching.
+MATCHING_INF = 1 << 40
+
+
+class Matching:
+    """
+    A minimum-cost assignment of boxes to storage points, kept together with
+    its dual potentials (Hungarian algorithm) so that it can be re-solved
+    incrementally when a single box moves.
+
+    Rows are boxes, in the order of `boxes`; columns are storage points, in
+    the order of Level.storage. Arrays are 1-indexed as in the textbook
+    formulation; row 0 and column 0 are sentinels.
+    """
+
+    __slots__ = ('boxes', 'rows', 'u', 'v', 'p', 'cost')
+
+    def __init__(self, boxes: list, rows: list, u: list, v: list, p: list):
+        """
+        :param boxes: the cell index of the box of each row.
+        :param rows: the assignment cost of each row to each storage point.
+        :param u: the row potentials.
+        :param v: the column potentials.
+        :param p: p[j] is the row assigned to column j, 0 if none.
+        """
+        self.boxes = boxes
+        self.rows = rows
+        self.u = u
+        self.v = v
+        self.p = p
+        cost = 0
+        for j in range(1, len(p)):
+            if p[j]:
+                cost += rows[p[j] - 1][j - 1]
+        self.cost = math.inf if cost >= MATCHING_INF else cost
+
+    @classmethod
+    def solve(cls, level: Level, boxes: list):
+        """
+        Solve the assignment of the given boxes from scratch in O(n^2 m).
+        """
+        columns = len(level.storage)
+        rows = [distance_row(level, box) for box in boxes]
+        u = [0] * (len(boxes) + 1)
+        v = [0] * (columns + 1)
+        p = [0] * (columns + 1)
+        for i in range(1, len(boxes) + 1):
+            _augment(rows, u, v, p, i)
+        return cls(boxes, rows, u, v, p)
+
+    def move(self, level: Level, old: int, new: int):
+        """
+        Return the matching after the box on cell old moved to cell new.
+        Only that box is unassigned and re-inserted, in O(n m).
+
+        With more storage points than boxes the storage point freed by the
+        box keeps its potential, which is then no longer optimal for a free
+        column, so the matching is solved from scratch instead.
+        """
+        i = self.boxes.index(old) + 1
+        boxes = self.boxes[:]
+        boxes[i - 1] = new
+        if len(boxes) < len(level.storage):
+            return Matching.solve(level, boxes)
+        rows = self.rows[:]
+        row = distance_row(level, new)
+        rows[i - 1] = row
+        u = self.u[:]
+        v = self.v
+        p = self.p[:]
+        p[p.index(i, 1)] = 0
+        # Restore dual feasibility for the changed row before re-inserting it.
+        u[i] = min(row[j - 1] - v[j] for j in range(1, len(v)))
+        v = v[:]
+        _augment(rows, u, v, p, i)
+        return Matching(boxes, rows, u, v, p)
+
+
+def distance_row(level: Level, cell: int) -> List[int]:
+    """
+    Return the push distance from the given cell to each storage point of
+    the level, with MATCHING_INF for storage points the box cannot reach.
+    """
+    size = len(level.cells)
+    return [MATCHING_INF if distance == UNREACHABLE else distance
+            for distance in level.push_distances[cell::size]]
+
+
+def _augment(rows: list, u: list, v: list, p: list, i: int):
+    """
+    Helper, insert row i into the partial assignment p along a shortest
+    augmenting path, updating the potentials u and v.
+    """
+    columns = len(v) - 1
+    minv = [math.inf] * (columns + 1)
+    used = [False] * (columns + 1)
+    way = [0] * (columns + 1)
+    p[0] = i
+    j0 = 0
+    while True:
+        used[j0] = True
+        i0 = p[j0]
+        row = rows[i0 - 1]
+        ui0 = u[i0]
+        delta = math.inf
+        j1 = 0
+        for j in range(1, columns + 1):
+            if not used[j]:
+                cur = row[j - 1] - ui0 - v[j]
+                if cur < minv[j]:
+                    minv[j] = cur
+                    way[j] = j0
+                if minv[j] < delta:
+                    delta = minv[j]
+                    j1 = j
+        for j in range(columns + 1):
+            if used[j]:
+                u[p[j]] += delta
+                v[j] -= delta
+            else:
+                minv[j] -= delta
+        j0 = j1
+        if p[j0] == 0:
+            break
+    while j0:
+        j1 = way[j0]
+        p[j0] = p[j1]
+        j0 = j1
+
+
+def get_matching(level: Level, box_bits: int) -> Matching:
+    """
+    Return the matching of the given box configuration.
+
+    Configurations are cached per level. A new configuration usually differs
+    from a cached one by a single push, so before solving from scratch this
+    looks for a cached configuration with one box a step away and updates
+    its matching incrementally.
+    """
+    matchings = level.matchings
+    matching = matchings.get(box_bits)
+    if matching is not None:
+        return matching
+    if len(matchings) >= MATCHING_CACHE_SIZE:
+        matchings.clear()
+
+    neighbours = level.neighbours
+    for box in bit_indices(box_bits):
+        for prev in neighbours[box]:
+            if prev < 0 or box_bits >> prev & 1:
+                continue
+            parent = matchings.get(box_bits ^ (1 << box) | (1 << prev))
+            if parent is not None:
+                matching = parent.move(level, prev, box)
+                matchings[box_bits] = matching
+                return matching
+
+    boxes = bit_indices(box_bits)
+    if len(boxes) > len(level.storage):
+        matching = Matching(boxes, [], [0], [0], [0])
+        matching.cost = math.inf
+    else:
+        matching = Matching.solve(level, boxes)
+    matchings[box_bits] = matching
+    return matching
+
+
+def heuristic_matching(board):
+    """
+    Returns the cost of a minimum-cost perfect matching between the boxes and
+    the storage points under push distance, so that no two boxes are counted
+    towards the same storage point. Never smaller than heuristic_basic.
+
+    :param board: The current board.
+    :type board: Board
+    :return: The heuristic value.
+    :rtype: int
+    """
+    return get_matching(board.level, board.box_bits).cost
+
+
+# Heuristics by their command line name.
+HEURISTICS = {
+    'zero': heuristic_zero,
+    'basic': heuristic_basic,
+    'advanced': heuristic_advanced,
+    'matching': heuristic_matching,
+}
+
+# What solve_puzzle prints before running each algorithm.
+ALGORITHM_TITLES = {
+    'a_star': "Executing A* search",
+    'anytime': "Executing anytime weighted A* search",
+    'ida_star': "Executing IDA* search",
+    'hda_star': "Executing hash-distributed A* search",
+    'bidirectional': "Executing bidirectional search",
+    'greedy': "Executing greedy best-first search",
+    'beam': "Executing beam search",
+    'portfolio': "Executing portfolio search",
+    'dfs': "Executing DFS",
+}
+
+
+def run_search(board: Board, algorithm: str, hfn, moves='step', **options):
+    """
+    Run the named search algorithm on the given board.
+
+    :param board: the initial board
+    :type board: Board
+    :param algorithm: the search algorithm
+    :type algorithm: str
+    :param hfn: The heuristic function
+    :type hfn: Optional[Heuristic]
+    :param moves: 'step' to search over robot steps, 'push' to search over box pushes
+    :type moves: str
+    :param options: extra keyword arguments of the search algorithm
+    :return: (the path to goal state, one state per robot step, solution cost)
+    :rtype: List[State], int
+    """
+    if algorithm == 'a_star':
+        if options.pop('node_store', False):
+            path, step = a_star_node_store(board, hfn, moves, **options)
+        elif options.get('memory_budget') is not None:
+            path, step = external_a_star(board, hfn, moves, **options)
+        else:
+            path, step = a_star(board, hfn, moves, **options)
+    elif algorithm == 'ida_star':
+        path, step = ida_star(board, hfn, moves, **options)
+    elif algorithm == 'hda_star':
+        path, step = hda_star(board, hfn, moves, **options)
+    elif algorithm == 'greedy':
+        path, step = greedy_best_first(board, hfn, moves, **options)
+    elif algorithm == 'beam':
+        path, step = beam_search(board, hfn, moves, **options)
+    elif algorithm == 'anytime':
+        path, step = anytime_a_star(board, hfn, moves, **options)
+    elif algorithm == 'bidirectional':
+        # Bidirectional search always works over pushes and expands its own path.
+        return bidirectional(board, hfn, **options)
+    elif algorithm == 'dfs':
+        path, step = dfs(board, moves, **options)
+    else:
+        raise NotImplementedError
+
+    if moves == 'push' and path:
+        path = expand_push_path(path)
+        # Count the steps actually replayed: searches that merge states of one
+        # push key may join walks whose length differs from the recorded cost.
+        step = len(path) - 1
+    return path, step
+
+
+# Configurations raced by the portfolio solver: (algorithm, heuristic, moves, options).
+# With fewer workers than configurations the first ones start first, so the
+# fast, incomplete configurations lead and the optimal ones follow.
+PORTFOLIO = [
+    ('bidirectional', 'matching', 'push', {'time_limit': 5.0}),
+    ('anytime', 'matching', 'push', {'weight': 5.0, 'weight_step': 0}),
+    ('greedy', 'advanced', 'push', {}),
+    ('beam', 'advanced', 'push', {'beam_width': BEAM_WIDTH}),
+    ('a_star', 'matching', 'push', {}),
+    ('anytime', 'matching', 'step', {'weight': 2.0, 'weight_step': 0}),
+    ('a_star', 'matching', 'step', {}),
+    ('a_star', 'advanced', 'step', {}),
+    ('a_star', 'basic', 'step', {}),
+    ('ida_star', 'matching', 'step', {}),
+    ('dfs', 'zero', 'push', {}),
+]
+
+
+def describe_config(config) -> str:
+    """
+    Return a readable name of a portfolio configuration.
+    """
+    algorithm, heuristic, moves, options = config
+    name = '{} + {} heuristic, {} moves'.format(algorithm, heuristic, moves)
+    if options:
+        name += ' ({})'.format(', '.join('{}={}'.format(*item) for item in sorted(options.items())))
+    return name
+
+
+def _portfolio_worker(job):
+    """
+    Helper, run one portfolio configuration in a worker process. The path is
+    sent back as plain robot and box positions rather than states. A
+    configuration that fails, e.g. because it does not support the level or
+    runs out of memory, finds no solution and sends back its error instead,
+    so that the other configurations keep running.
+    """
+    index, board, (algorithm, heuristic, moves, options) = job
+    try:
+        path, step = run_search(board, algorithm, HEURISTICS[heuristic], moves, **options)
+    except Exception as error:
+        return index, [], -1, '{}: {}'.format(type(error).__name__, error)
+    return index, [(state.board.robots, state.board.boxes) for state in path], step, None
+
+
+def portfolio_solve(board: Board, configs=None, workers=None):
+    """
+    Race several search configurations on the given board in a pool of
+    worker processes and keep the first solution found; the other searches
+    are cancelled as soon as it arrives.
+
+    :param board: the initial board
+    :type board: Board
+    :param configs: the (algorithm, heuristic, moves, options) configurations, PORTFOLIO by default
+    :type configs: Optional[List[tuple]]
+    :param workers: the number of worker processes, one per CPU by default
+    :type workers: Optional[int]
+    :return: (the path to goal state, solution cost, the winning configuration or None)
+    :rtype: List[State], int, Optional[tuple]
+    """
+    if configs is None:
+        configs = PORTFOLIO
+    if workers is None:
+        workers = os.cpu_count()
+    if isinstance(board, PackedBoard):
+        board = board.unpack()
+    jobs = [(index, board, config) for index, config in enumerate(configs)]
+
+    pool = multiprocessing.Pool(min(workers, len(jobs)))
+    try:
+        for index, positions, step, error in pool.imap_unordered(_portfolio_worker, jobs):
+            if error is not None:
+                print('{} failed: {}'.format(describe_config(configs[index]), error))
+            if not positions:
+                continue
+            path = []
+            for robots, boxes in positions:
+                new_board = Board(board.name, board.width, board.height, robots, boxes,
+                                  board.storage, board.obstacles, board.level)
+                path.append(State(new_board, heuristic_zero, step, len(path),
+                                  path[-1] if path else None))
+            return path, step, configs[index]
+    finally:
+        pool.terminate()
+        pool.join()
+    return [], -1, None
+
+
+# Algorithms that accept a SearchStats to count their work.
+STATS_ALGORITHMS = ('a_star', 'ida_star', 'greedy', 'beam', 'anytime', 'bidirectional', 'hda_star', 'dfs')
+
+
+def solve_puzzle(board: Board, algorithm: str, hfn, moves='step', output_format='moves',
+                 stats_output=None, progress=None, **options):
+    """
+    Solve the given puzzle using the given type of algorithm.
+
+    :param algorithm: the search algorithm
+    :type algorithm: str
+    :param hfn: The heuristic function
+    :type hfn: Optional[Heuristic]
+    :param moves: 'step' to search over robot steps, 'push' to search over box pushes
+    :type moves: str
+    :param output_format: 'moves' to print the solution as a move string, 'boards' to print every board
+    :type output_format: str
+    :param stats_output: '-' to print the search statistics, a file name to dump them as JSON, None for neither
+    :type stats_output: Optional[str]
+    :param progress: seconds between two progress lines of the search, None for none
+    :type progress: Optional[float]
+    :param options: extra keyword arguments of the search algorithm
+
+    :return: the path from the initial state to the goal state
+    :rtype: List[State]
+    """
+
+    print("Initial board")
+    board.display()
+
+    time_start = time.time()
+    stats = None
+
+    if algorithm not in ALGORITHM_TITLES:
+        raise NotImplementedError
+    print(ALGORITHM_TITLES[algorithm])
+
+    if algorithm in STATS_ALGORITHMS and (stats_output or progress or algorithm == 'hda_star'):
+        stats = options['stats'] = SearchStats(profile=bool(stats_output), progress=progress)
+        if stats_output:
+            tracemalloc.start()
+    elif stats_output or progress:
+        raise ValueError('{} does not report search statistics'.format(algorithm))
+    if algorithm == 'anytime':
+
+        def report_solution(path, cost, weight):
+            if moves == 'push':
+                path = expand_push_path(path)
+                cost = len(path) - 1
+            print('Solution cost {} found with weight {:.2f} after {:.2f}s: {}'.format(
+                cost, weight, time.time() - time_start, path_to_moves(label_robots(path))))
+
+        options['on_solution'] = report_solution
+
+    if algorithm == 'portfolio':
+        path, step, winner = portfolio_solve(board, **options)
+        if winner is not None:
+            print('Portfolio winner: {}'.format(describe_config(winner)))
+    else:
+        path, step = run_search(board, algorithm, hfn, moves, **options)
+    path = label_robots(path)
+
+    time_end = time.time()
+    time_elapsed = time_end - time_start
+
+    if stats is not None:
+        stats.elapsed = time_elapsed
+        if tracemalloc.is_tracing():
+            stats.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        if stats_output == '-':
+            print(stats)
+        elif stats_output:
+            with open(stats_output, 'w') as stats_file:
+                json.dump(dict(stats.as_dict(), level=board.name, algorithm=algorithm,
+                               moves=moves, cost=step), stats_file, indent=2)
+        if algorithm == 'hda_star' and time_elapsed > 0:
+            print('Throughput: {:.0f} expanded states/s over {} workers'.format(
+                stats.expanded / time_elapsed, options.get('workers') or os.cpu_count()))
+
+    if not path:
+
+        print('No solution for this puzzle')
+        return []
+
+    else:
+
+        print('Goal state found: ')
+        path[-1].board.display()
+
+        print('Solution is: ')
+
+        if output_format == 'boards':
+            counter = 0
+            while counter < len(path):
+                print(counter + 1)
+                path[counter].board.display()
+                print()
+                counter += 1
+        else:
+            print(path_to_moves(path))
+
+        print('Solution cost: {}'.format(step))
+        print('Time taken: {:.2f}s'.format(time_elapsed))
+
+        return path
+
+
+# Letters of the moves of a move string, in the order of DIRECTIONS; pushes are capitals.
+MOVE_LETTERS = 'rlud'
+
+
+def path_to_moves(path) -> str:
+    """
+    Return the move string of a step-by-step path whose robots keep their
+    order (see label_robots). Each run of moves of one robot is written as
+    the robot's label, a colon and one letter per step, e.g. 'a:rrUl b:dD':
+    r, l, u and d for right, left, up and down, in capitals for a push.
+
+    :param path: the path from the initial state to the goal state
+    :type path: List[State]
+    :return: the move string
+    :rtype: str
+    """
+    runs = []
+    current = None
+    for state, next_state in zip(path, path[1:]):
+        board = state.board
+        for robot, (start, end) in enumerate(zip(board.robots, next_state.board.robots)):
+            if start != end:
+                break
+        else:
+            continue
+        letter = MOVE_LETTERS[DIRECTIONS.index((end[0] - start[0], end[1] - start[1]))]
+        if end in board.boxes:
+            letter = letter.upper()
+        if robot != current:
+            runs.append(chr(ord(CHAR_ROBOT) + robot) + ':')
+            current = robot
+        runs[-1] += letter
+    return ' '.join(runs)
+
+
+def replay_solution(board: Board, moves: str):
+    """
+    Replay a move string from the given board, yielding the board after
+    each step, so boards are only built as they are needed. A move that is
+    not legal or does not match its case raises a ValueError.
+
+    :param board: the initial board
+    :type board: Board
+    :param moves: the move string (see path_to_moves)
+    :type moves: str
+    :return: the boards after each step, in order
+    :rtype: Iterator[Board]
+    """
+    if isinstance(board, PackedBoard):
+        board = board.unpack()
+    step = 0
+    for run in moves.split():
+        label, _, letters = run.partition(':')
+        robot = ord(label) - ord(CHAR_ROBOT) if len(label) == 1 else -1
+        if not 0 <= robot < len(board.robots):
+            raise ValueError('unknown robot {!r} in {!r}'.format(label, run))
+        for letter in letters:
+            step += 1
+            if letter.lower() not in MOVE_LETTERS:
+                raise ValueError('step {}: unknown move {!r}'.format(step, letter))
+            dx, dy = DIRECTIONS[MOVE_LETTERS.index(letter.lower())]
+            start = board.robots[robot]
+            end = (start[0] + dx, start[1] + dy)
+            if end in board.obstacles or end in board.robots:
+                raise ValueError('step {}: robot {} is blocked at {}'.format(step, label, end))
+            if end in board.boxes:
+                box_end = (end[0] + dx, end[1] + dy)
+                if not letter.isupper():
+                    raise ValueError('step {}: {!r} pushes a box, expected {!r}'.format(
+                        step, letter, letter.upper()))
+                if box_end in board.obstacles or box_end in board.robots or box_end in board.boxes:
+                    raise ValueError('step {}: the box at {} is blocked'.format(step, end))
+                board = init_new_board(board, start, end, end, box_end)
+            elif letter.isupper():
+                raise ValueError('step {}: {!r} pushes no box, expected {!r}'.format(
+                    step, letter, letter.lower()))
+            else:
+                board = init_new_board(board, start, end)
+            yield board
+
+
+def verify_solution(board: Board, moves: str) -> int:
+    """
+    Check that a move string solves the given board and return its cost.
+    A move string that is not legal or does not end in a goal raises a
+    ValueError.
+
+    :param board: the initial board
+    :type board: Board
+    :param moves: the move string (see path_to_moves)
+    :type moves: str
+    :return: the number of steps of the solution
+    :rtype: int
+    """
+    cost = 0
+    for board in replay_solution(board, moves):
+        cost += 1
+    if not is_goal(State(board, heuristic_zero, 0, 0)):
+        raise ValueError('the moves do not end with every box on a storage point')
+    return cost
+
+
+def write_solution(path, filename: str, output_format='moves'):
+    """
+    Write a solution path to a file, as a move string or, with the 'boards'
+    format, one numbered board per state.
+
+    :param path: the path from the initial state to the goal state
+    :type path: List[State]
+    :param filename: the output file
+    :type filename: str
+    :param output_format: 'moves' or 'boards'
+    :type output_format: str
+    """
+    outputfile = open(filename, "w")
+    if output_format == 'boards':
+        counter = 1
+        for state in path:
+            print(counter, file=outputfile)
+            print(state.board, file=outputfile)
+            counter += 1
+    elif path:
+        print(path_to_moves(path), file=outputfile)
+    outputfile.close()
+
+
+# File extensions of the level files picked up from a batch directory.
+BATCH_EXTENSIONS = ('.txt', '.xsb', '.sok')
+
+
+def batch_files(source: str) -> List[str]:
+    """
+    Return the level files of a batch, sorted: every level file of a
+    directory, or the files matching a glob pattern.
+    """
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source)
+                 if name.endswith(BATCH_EXTENSIONS)]
+    else:
+        paths = glob.glob(source)
+    return sorted(path for path in paths if os.path.isfile(path))
+
+
+def batch_levels(source: str):
+    """
+    Yield the (level id, board) pairs of a batch, parsing each file lazily
+    so the first levels can be solved while later ones are still read.
+    A file holding a single level is identified by its path, the levels of
+    a collection by the path and their 1-based number, as 'path#3'.
+    """
+    for path in batch_files(source):
+        previous = None
+        number = 0
+        for board in iter_levels(path):
+            number += 1
+            if previous is not None:
+                yield '{}#{}'.format(path, number - 1), previous
+            previous = board
+        if previous is not None:
+            yield (path if number == 1 else '{}#{}'.format(path, number)), previous
+
+
+def solution_filename(level_id: str) -> str:
+    """
+    Return the name of the solution file of a batch level, e.g. 'easy.txt'
+    for 'levels/easy.txt' and 'set_3.txt' for 'levels/set.xsb#3'.
+    """
+    path, _, number = level_id.partition('#')
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return '{}_{}.txt'.format(stem, number) if number else stem + '.txt'
+
+
+def load_batch_results(filename: str) -> dict:
+    """
+    Return the results already written to a JSON-lines results file, keyed
+    by level file. A line cut short by a crash is ignored.
+    """
+    results = {}
+    if not os.path.exists(filename):
+        return results
+    with open(filename) as results_file:
+        for line in results_file:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            results[result['level']] = result
+    return results
+
+
+def _raise_timeout(signum, frame):
+    raise TimeoutError
+
+
+def solve_level(board: Board, algorithm: str, heuristic: str, moves='step', options=None,
+                timeout=None, memory_limit=None):
+    """
+    Solve one level under a timeout and a memory cap and return its result
+    record with the path found, for batch and benchmark runs. The timeout
+    is enforced with an interval timer and the memory cap with an
+    address-space limit, which stays set for the rest of the process, so
+    this is meant to run in a fresh worker process; a level that runs out
+    of either ends with a status instead of taking the run down.
+
+    :param board: the initial board
+    :type board: Board
+    :param algorithm: the search algorithm
+    :type algorithm: str
+    :param heuristic: the name of the heuristic, a key of HEURISTICS
+    :type heuristic: str
+    :param moves: 'step' to search over robot steps, 'push' to search over box pushes
+    :type moves: str
+    :param options: extra keyword arguments of the search algorithm
+    :type options: Optional[dict]
+    :param timeout: seconds allowed, if any
+    :type timeout: Optional[float]
+    :param memory_limit: megabytes of address space allowed, if any
+    :type memory_limit: Optional[int]
+    :return: (the result record, the path to goal state)
+    :rtype: dict, List[State]
+    """
+    result = {'status': 'error', 'cost': None, 'expanded': None, 'generated': None,
+              'time': None, 'peak_rss': None}
+    options = dict(options or {})
+    path = []
+    time_start = time.time()
+    try:
+        if memory_limit and resource is not None:
+            limit = memory_limit * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        if timeout:
+            signal.signal(signal.SIGALRM, _raise_timeout)
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        stats = None
+        if algorithm in STATS_ALGORITHMS:
+            stats = options['stats'] = SearchStats()
+
+        path, step = run_search(board, algorithm, HEURISTICS[heuristic], moves, **options)
+        if timeout:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        result['time'] = round(time.time() - time_start, 3)
+        if stats is not None:
+            result['expanded'] = stats.expanded
+            result['generated'] = stats.generated
+        if path:
+            result['status'] = 'solved'
+            result['cost'] = step
+        else:
+            result['status'] = 'unsolvable'
+    except TimeoutError:
+        result['status'] = 'timeout'
+    except MemoryError:
+        result['status'] = 'memory'
+    except Exception as error:
+        result['error'] = '{}: {}'.format(type(error).__name__, error)
+    if timeout:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+    if result['time'] is None:
+        result['time'] = round(time.time() - time_start, 3)
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux
+        result['peak_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return result, path
+
+
+def _batch_worker(job):
+    """
+    Helper, solve one level of a batch in a fresh worker process, write its
+    solution and return its result record.
+    """
+    level_id, board, algorithm, heuristic, moves, options, settings = job
+    result = {'level': level_id, 'level_name': board.name, 'algorithm': algorithm,
+              'heuristic': heuristic, 'moves': moves}
+    if settings['compact']:
+        board = PackedBoard.from_board(board)
+    if settings['cache_dir']:
+        load_deadlock_table(board.level, settings['cache_dir'])
+        load_push_distances(board.level, settings['cache_dir'])
+
+    level_result, path = solve_level(board, algorithm, heuristic, moves, options,
+                                     settings['timeout'], settings['memory_limit'])
+    result.update(level_result)
+    if settings['cache_dir'] and result['status'] in ('solved', 'unsolvable'):
+        save_deadlock_table(board.level, settings['cache_dir'])
+    if path:
+        solution_file = os.path.join(settings['solution_dir'], solution_filename(level_id))
+        write_solution(label_robots(path), solution_file, settings['output_format'])
+        result['solution'] = solution_file
+    return result
+
+
+def batch_solve(source: str, results_file: str, solution_dir: str, algorithm: str,
+                heuristic: str, moves='step', options=None, workers=None, timeout=None,
+                memory_limit=None, compact=False, cache_dir=None, output_format='moves') -> List[dict]:
+    """
+    Solve every level of a directory or glob pattern in a pool of worker
+    processes, one fresh process per level. Files may hold one level or a
+    whole collection (see iter_levels), read as the pool consumes them.
+
+    One JSON object per level is appended to the results file as soon as
+    the level finishes, with its status ('solved', 'unsolvable', 'timeout',
+    'memory' or 'error'), cost, counters and time; solutions are written to
+    the solution directory (see solution_filename). Levels that already
+    have a result are skipped, so a crashed batch resumes where it stopped.
+
+    :param source: a directory of level files or a glob pattern
+    :type source: str
+    :param results_file: the JSON-lines results file
+    :type results_file: str
+    :param solution_dir: the directory of the solution files
+    :type solution_dir: str
+    :param algorithm: the search algorithm
+    :type algorithm: str
+    :param heuristic: the name of the heuristic, a key of HEURISTICS
+    :type heuristic: str
+    :param moves: 'step' to search over robot steps, 'push' to search over box pushes
+    :type moves: str
+    :param options: extra keyword arguments of the search algorithm
+    :type options: Optional[dict]
+    :param workers: the number of worker processes, one per CPU by default
+    :type workers: Optional[int]
+    :param timeout: seconds allowed per level, if any
+    :type timeout: Optional[float]
+    :param memory_limit: megabytes of address space allowed per level, if any
+    :type memory_limit: Optional[int]
+    :param compact: whether to search over bit-packed boards
+    :type compact: bool
+    :param cache_dir: the directory of per-level data reused across runs, if any
+    :type cache_dir: Optional[str]
+    :param output_format: the format of the solution files, 'moves' or 'boards'
+    :type output_format: str
+    :return: the results of the levels solved by this call
+    :rtype: List[dict]
+    """
+    if workers is None:
+        workers = os.cpu_count()
+    done = load_batch_results(results_file)
+    os.makedirs(solution_dir, exist_ok=True)
+    settings = {'timeout': timeout, 'memory_limit': memory_limit, 'compact': compact,
+                'cache_dir': cache_dir, 'solution_dir': solution_dir, 'output_format': output_format}
+    jobs = ((level_id, board, algorithm, heuristic, moves, dict(options or {}), settings)
+            for level_id, board in batch_levels(source) if level_id not in done)
+
+    results = []
+    # A fresh process per level keeps one level's memory and any crash away from the others.
+    pool = multiprocessing.Pool(workers, maxtasksperchild=1)
+    try:
+        with open(results_file, 'a') as output:
+            for result in pool.imap_unordered(_batch_worker, jobs):
+                print(json.dumps(result), file=output, flush=True)
+                results.append(result)
+                print('{}: {} (cost {}, {:.2f}s)'.format(
+                    result['level'], result['status'], result['cost'], result['time']))
+    finally:
+        pool.terminate()
+        pool.join()
+    return results
 
 
 if __name__ == "__main__":
@@ -320,20 +3393,87 @@ if __name__ == "__main__":
     parser.add_argument(
         "--inputfile",
         type=str,
-        required=True,
+        required=False,
         help="The file that contains the puzzle."
     )
     parser.add_argument(
         "--outputfile",
         type=str,
-        required=True,
+        required=False,
         help="The file that contains the solution to the puzzle."
     )
+    parser.add_argument(
+        "--stats",
+        type=str,
+        required=False,
+        nargs="?",
+        const="-",
+        default=None,
+        help="Report search statistics, profile timers and peak memory (traced, which slows the search): "
+             "printed, or dumped as JSON to the given file."
+    )
+    parser.add_argument(
+        "--progress",
+        type=float,
+        required=False,
+        default=None,
+        help="Print a progress line with nodes/s every this many seconds of search."
+    )
+    parser.add_argument(
+        "--output-format",
+        type=str,
+        required=False,
+        default="moves",
+        choices=["moves", "boards"],
+        help="Write the solution as a move string, or as the full board of every step."
+    )
+    parser.add_argument(
+        "--verify",
+        type=str,
+        required=False,
+        default=None,
+        help="Check that the move string in this file solves --inputfile instead of searching."
+    )
+    parser.add_argument(
+        "--batch",
+        type=str,
+        required=False,
+        default=None,
+        help="Solve every level of a directory or glob pattern instead of --inputfile."
+    )
+    parser.add_argument(
+        "--results",
+        type=str,
+        required=False,
+        default="results.jsonl",
+        help="The JSON-lines file the batch results are appended to; levels already in it are skipped."
+    )
+    parser.add_argument(
+        "--solution-dir",
+        type=str,
+        required=False,
+        default="solutions",
+        help="The directory the batch solution files are written to."
+    )
+    parser.add_argument(
+        "--level-timeout",
+        type=float,
+        required=False,
+        default=None,
+        help="Seconds allowed per level of a batch."
+    )
+    parser.add_argument(
+        "--memory-limit",
+        type=int,
+        required=False,
+        default=None,
+        help="Megabytes of memory allowed per level of a batch."
+    )
     parser.add_argument(
         "--algorithm",
         type=str,
-        required=True,
-        choices=['a_star', 'dfs'],
+        required=False,
+        choices=list(ALGORITHM_TITLES),
         help="The searching algorithm."
     )
     parser.add_argument(
@@ -341,29 +3481,213 @@ if __name__ == "__main__":
         type=str,
         required=False,
         default=None,
-        choices=['zero', 'basic', 'advanced'],
+        choices=list(HEURISTICS),
         help="The heuristic used for any heuristic search."
     )
+    parser.add_argument(
+        "--moves",
+        type=str,
+        required=False,
+        default='step',
+        choices=['step', 'push'],
+        help="Expand single robot steps, or box pushes with the robot walk folded in."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        required=False,
+        default=None,
+        help="The number of worker processes of the portfolio, HDA* and batch runs (default: one per CPU)."
+    )
+    parser.add_argument(
+        "--beam-width",
+        type=int,
+        required=False,
+        default=BEAM_WIDTH,
+        help="The number of states beam search keeps per depth layer."
+    )
+    parser.add_argument(
+        "--time-limit",
+        type=float,
+        required=False,
+        default=None,
+        help="Seconds after which the anytime or bidirectional search returns its best solution."
+    )
+    parser.add_argument(
+        "--weight",
+        type=float,
+        required=False,
+        default=ANYTIME_WEIGHT,
+        help="The initial heuristic weight of the anytime search."
+    )
+    parser.add_argument(
+        "--tt-size",
+        type=int,
+        required=False,
+        default=TABLE_SIZE,
+        help="The number of entries of the IDA* and beam search transposition table; it takes this many times "
+             "24 bytes plus two bitboards of the level."
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        required=False,
+        default=None,
+        help="Directory for per-level data (learned deadlocks, push distances) reused across runs."
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Search over bit-packed boards that share the static walls and storage."
+    )
+    parser.add_argument(
+        "--open-list",
+        type=str,
+        required=False,
+        default="bucket",
+        choices=list(OPEN_LISTS),
+        help="The A* frontier: integer f buckets, or a heap for non-integer heuristics."
+    )
+    parser.add_argument(
+        "--tie-break",
+        type=str,
+        required=False,
+        default="g",
+        choices=["g", "lifo"],
+        help="The order of A* states of equal f in the bucket frontier: deepest first, or last in first out."
+    )
+    parser.add_argument(
+        "--checkpoint",
+        type=str,
+        required=False,
+        default=None,
+        help="Snapshot file of an A* or DFS search, written at intervals and on SIGTERM."
+    )
+    parser.add_argument(
+        "--checkpoint-interval",
+        type=float,
+        required=False,
+        default=None,
+        help="Seconds between two snapshots (default: only on SIGTERM). Every snapshot rewrites the "
+             "whole frontier, its ancestors and the explored set, which takes longer as the search "
+             "grows; an interval of a second can double the run time, so use minutes on large searches."
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue the search saved in the --checkpoint file."
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=float,
+        required=False,
+        default=None,
+        help="Megabytes of A* states held in memory; beyond it the closed set and frontier spill to disk."
+    )
+    parser.add_argument(
+        "--spill-dir",
+        type=str,
+        required=False,
+        default=None,
+        help="Directory of the files of --memory-budget searches (default: the system temporary directory)."
+    )
+    parser.add_argument(
+        "--node-store",
+        action="store_true",
+        help="Keep the A* nodes in typed arrays and rebuild the path from move codes."
+    )
     args = parser.parse_args()
+    if args.verify is not None:
+        if args.inputfile is None:
+            parser.error("--verify needs the puzzle in --inputfile")
+        with open(args.verify) as solution_file:
+            solution = solution_file.read()
+        try:
+            cost = verify_solution(read_from_file(args.inputfile), solution)
+        except ValueError as error:
+            print('Invalid solution: {}'.format(error))
+            raise SystemExit(1)
+        print('Valid solution, cost {}'.format(cost))
+        raise SystemExit
+    if args.algorithm is None:
+        parser.error("--algorithm is required unless --verify is given")
+    if args.batch is None and (args.inputfile is None or args.outputfile is None):
+        parser.error("--inputfile and --outputfile are required unless --batch is given")
+    if args.batch is not None and args.algorithm in ('portfolio', 'hda_star'):
+        parser.error("--batch runs every level in its own worker, use a single-process algorithm")
+    if args.checkpoint is not None and (args.algorithm not in CHECKPOINT_ALGORITHMS or args.node_store
+                                        or args.batch is not None):
+        parser.error("--checkpoint only applies to a single a_star (without --node-store) or dfs search")
+    if args.resume and args.checkpoint is None:
+        parser.error("--resume needs the snapshot in --checkpoint")
+    if args.memory_budget is not None and (args.algorithm != 'a_star' or args.node_store
+                                           or args.checkpoint is not None):
+        parser.error("--memory-budget only applies to a_star, without --node-store or --checkpoint")
+    if (args.stats is not None or args.progress is not None) and args.algorithm not in STATS_ALGORITHMS:
+        parser.error("--stats and --progress only apply to the algorithms " + ", ".join(STATS_ALGORITHMS))
 
     # set the heuristic function
-    heuristic = heuristic_zero
-    if args.heuristic == 'basic':
-        heuristic = heuristic_basic
-    elif args.heuristic == 'advanced':
-        heuristic = heuristic_advanced
+    heuristic_name = 'zero'
+    if args.heuristic is not None:
+        heuristic_name = args.heuristic
+    elif args.algorithm in ('greedy', 'beam'):
+        # ordering on a zero heuristic would be meaningless
+        heuristic_name = 'advanced'
+    heuristic = HEURISTICS[heuristic_name]
+
+    # options of the chosen algorithm
+    options = {}
+    if args.algorithm == 'a_star' and args.node_store:
+        options['node_store'] = True
+    elif args.algorithm == 'a_star' and args.memory_budget is not None:
+        options['memory_budget'] = args.memory_budget
+        options['spill_dir'] = args.spill_dir
+    elif args.algorithm == 'a_star':
+        options['open_list'] = args.open_list
+        options['tie_break'] = args.tie_break
+    elif args.algorithm == 'ida_star':
+        options['table_size'] = args.tt_size
+    elif args.algorithm == 'beam':
+        options['beam_width'] = args.beam_width
+        options['table_size'] = args.tt_size
+    elif args.algorithm == 'anytime':
+        options['time_limit'] = args.time_limit
+        options['weight'] = args.weight
+    elif args.algorithm == 'bidirectional':
+        options['time_limit'] = args.time_limit
+    elif args.algorithm in ('portfolio', 'hda_star'):
+        options['workers'] = args.workers
+
+    if args.checkpoint is not None:
+        options['checkpoint'] = Checkpoint(args.checkpoint, args.checkpoint_interval, args.resume)
+
+    if args.batch is not None:
+        batch_solve(args.batch, args.results, args.solution_dir, args.algorithm,
+                    heuristic_name, args.moves, options, args.workers, args.level_timeout,
+                    args.memory_limit, args.compact, args.cache_dir, args.output_format)
+        raise SystemExit
 
     # read the boards from the file
     board = read_from_file(args.inputfile)
+    if args.compact:
+        board = PackedBoard.from_board(board)
+    if args.cache_dir:
+        load_deadlock_table(board.level, args.cache_dir)
+        load_push_distances(board.level, args.cache_dir)
 
     # solve the puzzles
-    path = solve_puzzle(board, args.algorithm, heuristic)
+    try:
+        path = solve_puzzle(board, args.algorithm, heuristic, args.moves, args.output_format,
+                            args.stats, args.progress, **options)
+    except SearchInterrupted as interrupted:
+        print('Search interrupted, {}; continue it with --resume'.format(interrupted))
+        raise SystemExit(128 + signal.SIGTERM)
+    except ValueError as error:
+        # e.g. a level the chosen algorithm does not support
+        print('Cannot solve {}: {}'.format(args.inputfile, error))
+        raise SystemExit(1)
+    if args.cache_dir:
+        save_deadlock_table(board.level, args.cache_dir)
 
     # save solution in output file
-    outputfile = open(args.outputfile, "w")
-    counter = 1
-    for state in path:
-        print(counter, file=outputfile)
-        print(state.board, file=outputfile)
-        counter += 1
-    outputfile.close()
\ No newline at end of file
+    write_solution(path, args.outputfile, args.output_format)
\ No newline at end of file
@@ -0,0 +1,193 @@
+############################################################
+## CSC 384, Intro to AI, University of Toronto.
+## Checks of the Sokoban solver
+############################################################
+
+import contextlib
+import io
+import os
+import random
+import signal
+import tempfile
+import unittest
+
+from solve import *
+
+# Directory of the curated benchmark levels.
+LEVEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark', 'levels')
+
+# Random box placements tried per level and box count.
+PLACEMENTS = 300
+
+# A level of more than 61 cells, so that bitboards exceed the modulus of
+# Python's int hash.
+WIDE_ROWS = ['############',
+             '#          #',
+             '#  ?    .  #',
+             '#  a       #',
+             '#    ?   . #',
+             '#          #',
+             '#   ?   .  #',
+             '#          #',
+             '############']
+
+
+def benchmark_board(name: str) -> Board:
+    """
+    Return the board of the benchmark level with the given name.
+    """
+    return read_from_file(os.path.join(LEVEL_DIR, name + '.txt'))
+
+
+class LevelParsingTest(unittest.TestCase):
+
+    def test_name_with_wall_character(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as collection:
+            collection.write('Level #a\n6\n4\n######\n#a? .#\n#    #\n######\n\n'
+                             '; Level #b\n#####\n#@$.#\n#####\n')
+        try:
+            boards = list(iter_levels(collection.name))
+        finally:
+            os.remove(collection.name)
+        self.assertEqual([board.name for board in boards], ['Level #a', 'Level #b'])
+        self.assertEqual(boards[0].boxes, [(2, 1)])
+        self.assertEqual(boards[1].robots, [(1, 1)])
+
+
+class MatchingTest(unittest.TestCase):
+
+    def check_moves(self, level: Level, box_count: int, rng: random.Random):
+        live = [cell for cell in range(len(level.cells)) if not level.dead_bits >> cell & 1]
+        for _ in range(PLACEMENTS):
+            boxes = rng.sample(live, box_count)
+            matching = Matching.solve(level, boxes)
+            box = rng.choice(boxes)
+            for new in level.neighbours[box]:
+                if new < 0 or new in boxes:
+                    continue
+                moved = [new if cell == box else cell for cell in boxes]
+                self.assertEqual(matching.move(level, box, new).cost, Matching.solve(level, moved).cost,
+                                 'boxes {} moving {} -> {}'.format(boxes, box, new))
+
+    def test_move_matches_solve(self):
+        rng = random.Random(384)
+        for name in ('hard_six_boxes', 'medium_two_robots', 'easy_three_boxes'):
+            level = benchmark_board(name).level
+            for box_count in range(1, len(level.storage) + 1):
+                self.check_moves(level, box_count, rng)
+
+
+class PushModeTest(unittest.TestCase):
+
+    def test_optimal_searches_keep_step_costs(self):
+        for name in ('easy_three_boxes', 'easy_freeze', 'easy_corridor', 'tiny_two_robots'):
+            board = benchmark_board(name)
+            _, optimal = run_search(board, 'a_star', heuristic_matching, 'step')
+            for algorithm in ('a_star', 'ida_star'):
+                _, cost = run_search(board, algorithm, heuristic_matching, 'push')
+                self.assertEqual(cost, optimal, '{} on {}'.format(algorithm, name))
+
+
+class BidirectionalTest(unittest.TestCase):
+
+    def test_cost_matches_a_star(self):
+        for name in ('tiny_one_box', 'easy_three_boxes', 'easy_freeze', 'easy_corridor'):
+            board = benchmark_board(name)
+            _, cost = run_search(board, 'bidirectional', heuristic_matching, 'push')
+            _, optimal = run_search(board, 'a_star', heuristic_matching, 'step')
+            self.assertEqual(cost, optimal, name)
+
+    def test_path_is_legal(self):
+        board = benchmark_board('easy_corridor')
+        path, cost = run_search(board, 'bidirectional', heuristic_matching, 'push')
+        self.assertEqual(verify_solution(board, path_to_moves(path)), cost)
+
+    def test_several_robots_rejected(self):
+        with self.assertRaises(ValueError):
+            bidirectional(benchmark_board('tiny_two_robots'), heuristic_matching)
+
+
+class NodeStoreTest(unittest.TestCase):
+
+    def test_keys_of_wide_level(self):
+        board = PackedBoard.from_board(board_from_rows('wide', WIDE_ROWS))
+        level = board.level
+        self.assertGreater(len(level.cells), 61)
+        # Move the first box to cell 0, then to cell 61, both free floor.
+        others = board.box_bits ^ 1 << level.index[board.boxes[0]]
+        board = PackedBoard(level, others | 1, board.robot_bits)
+        aliased = PackedBoard(level, others | 1 << 61, board.robot_bits)
+        # The bitboards of both boards have the same int hash.
+        self.assertEqual(hash(push_cell_key(board)), hash(push_cell_key(aliased)))
+        for key_fn in (None, push_cell_key, push_key):
+            self.assertNotEqual(zobrist_key(board, key_fn), zobrist_key(aliased, key_fn))
+
+    def test_cost_matches_a_star_on_wide_level(self):
+        board = board_from_rows('wide', WIDE_ROWS)
+        _, optimal = run_search(board, 'a_star', heuristic_matching, 'push')
+        _, cost = a_star_node_store(board, heuristic_matching, 'push')
+        self.assertEqual(cost, optimal)
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.filename = tempfile.mkstemp(suffix='.snap')
+        os.close(handle)
+        self.addCleanup(os.remove, self.filename)
+        self.addCleanup(signal.signal, signal.SIGTERM, signal.getsignal(signal.SIGTERM))
+
+    def save_snapshot(self, board: Board):
+        # An interval this short saves before every expansion.
+        a_star(board, heuristic_matching, checkpoint=Checkpoint(self.filename, 1e-9))
+
+    def test_resume_keeps_cost(self):
+        board = benchmark_board('easy_three_boxes')
+        self.save_snapshot(board)
+        _, cost = a_star(board, heuristic_matching, checkpoint=Checkpoint(self.filename, resume=True))
+        self.assertEqual(cost, 12)
+
+    def test_other_settings_rejected(self):
+        board = benchmark_board('easy_three_boxes')
+        self.save_snapshot(board)
+        for options in ({'hfn': heuristic_basic}, {'hfn': heuristic_matching, 'tie_break': 'lifo'},
+                        {'hfn': heuristic_matching, 'open_list': 'heap'}):
+            with self.assertRaises(ValueError):
+                a_star(board, checkpoint=Checkpoint(self.filename, resume=True), **options)
+
+
+def heuristic_failing(board):
+    """
+    A heuristic that fails on every board, to break the workers running it.
+    """
+    raise RuntimeError('heuristic failed')
+
+
+class HDAStarTest(unittest.TestCase):
+
+    def test_cost_matches_a_star(self):
+        board = benchmark_board('easy_three_boxes')
+        _, optimal = run_search(board, 'a_star', heuristic_matching, 'step')
+        _, cost = hda_star(board, heuristic_matching, workers=2)
+        self.assertEqual(cost, optimal)
+
+    def test_failing_worker_raises(self):
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(RuntimeError):
+                hda_star(benchmark_board('easy_three_boxes'), heuristic_failing, workers=2)
+
+
+class PortfolioTest(unittest.TestCase):
+
+    def test_failing_configuration_is_reported(self):
+        configs = [('a_star', 'matching', 'step', {'no_such_option': 1}), ('a_star', 'matching', 'step', {})]
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            _, cost, winner = portfolio_solve(benchmark_board('tiny_two_robots'), configs, workers=1)
+        self.assertEqual(cost, 6)
+        self.assertEqual(winner, configs[1])
+        self.assertIn('{} failed: TypeError'.format(describe_config(configs[0])), output.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()